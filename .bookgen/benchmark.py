@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+BookGen Benchmark
+Generates synthetic books and measures BookGen build throughput
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import resource
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from contextlib import redirect_stdout
+from typing import List, Dict, Optional
+
+WORDS = (
+    "agent model prompt context memory retrieval vector graph tool schema "
+    "curator workflow pipeline embedding token latency grounding evaluation "
+    "creative brand community design system protocol interface deploy scale "
+    "knowledge index query answer source trust human collaboration signal"
+).split()
+
+CODE_SAMPLES = [
+    ("python", '''def retrieve(query, index, k=5):
+    """Return the k most similar documents"""
+    scores = index.search(embed(query), k)
+    return [doc for doc, score in scores if score > 0.2]
+'''),
+    ("javascript", '''export async function callAgent(prompt) {
+  const response = await fetch('/api/agent', {
+    method: 'POST',
+    body: JSON.stringify({ prompt }),
+  });
+  return response.json();
+}
+'''),
+    ("bash", '''pip install markdown
+python3 .bookgen/generator.py . --incremental
+'''),
+    ("json", '''{
+  "name": "curator",
+  "tools": ["search", "summarize"],
+  "temperature": 0.7
+}
+'''),
+    # No language: codehilite falls back to guessing the lexer
+    ("", '''SELECT page, COUNT(*) AS visits
+FROM analytics
+GROUP BY page
+ORDER BY visits DESC;
+'''),
+]
+
+ADMONITIONS = ["note", "tip", "warning", "danger"]
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    """A capitalized pseudo-sentence"""
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def generate_page(rng: random.Random, title: str) -> str:
+    """A page mixing the Markdown features our cookbooks use"""
+    parts = [f"# {title}\n", sentence(rng, 30) + "\n"]
+    footnotes = []
+
+    for section in range(rng.randint(3, 6)):
+        parts.append(f"## {sentence(rng, 4)[:-1]}\n")
+        parts.append(' '.join(sentence(rng) for _ in range(rng.randint(2, 5))) + "\n")
+
+        feature = rng.randrange(5)
+        if feature == 0:
+            language, code = rng.choice(CODE_SAMPLES)
+            parts.append(f"```{language}\n{code}```\n")
+        elif feature == 1:
+            rows = [f"| {rng.choice(WORDS)} | {rng.randint(1, 100)} | {sentence(rng, 4)} |"
+                    for _ in range(rng.randint(3, 8))]
+            parts.append("| Name | Score | Notes |\n|------|-------|-------|\n" + '\n'.join(rows) + "\n")
+        elif feature == 2:
+            note = len(footnotes) + 1
+            footnotes.append(f"[^{note}]: {sentence(rng, 8)}")
+            parts.append(f"{sentence(rng)} See the reference[^{note}].\n")
+        elif feature == 3:
+            parts.append(f'!!! {rng.choice(ADMONITIONS)} "{sentence(rng, 3)[:-1]}"\n'
+                         f"    {sentence(rng, 16)}\n")
+        else:
+            parts.append('\n'.join(f"* **{rng.choice(WORDS)}**: {sentence(rng, 8)}"
+                                   for _ in range(rng.randint(3, 6))) + "\n")
+
+    parts.extend(footnotes)
+    return '\n'.join(parts) + '\n'
+
+
+def generate_book(root: Path, pages: int, seed: int = 0):
+    """Write a synthetic book with a matching SUMMARY.md, readme.md and book.json"""
+    rng = random.Random(seed)
+    if root.exists():
+        shutil.rmtree(root)
+    root.mkdir(parents=True)
+
+    summary = ["# Table of Contents\n", "* [Start Here](readme.md)\n"]
+    per_section = 25
+    for index in range(pages):
+        if index % per_section == 0:
+            summary.append(f"\n## Section {index // per_section + 1}\n")
+        path = f"docs/section-{index // per_section + 1:04d}/page-{index:05d}.md"
+        title = f"Page {index}: {sentence(rng, 3)[:-1]}"
+        summary.append(f"* [{title}]({path})")
+
+        page_path = root / path
+        page_path.parent.mkdir(parents=True, exist_ok=True)
+        page_path.write_text(generate_page(rng, title), encoding='utf-8')
+
+    (root / "SUMMARY.md").write_text('\n'.join(summary) + '\n', encoding='utf-8')
+    (root / "readme.md").write_text(generate_page(rng, "Synthetic Book"), encoding='utf-8')
+    (root / "book.json").write_text(json.dumps({
+        "title": "BookGen Benchmark",
+        "description": f"Synthetic book with {pages} pages",
+        "author": "BookGen",
+    }, indent=2), encoding='utf-8')
+
+
+# How often measure() samples the resident set size of a build's process tree
+RSS_SAMPLE_SECONDS = 0.05
+
+
+def max_process_rss_mb() -> float:
+    """Peak resident set size of the largest single process among this one
+    and its children, in MiB. RUSAGE_CHILDREN reports the largest child,
+    not the sum over worker processes (see tree_rss_mb)."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return max(own, children) / scale
+
+
+def tree_rss_mb(pid: int) -> Optional[float]:
+    """Current resident set size of a process and all its descendants, in
+    MiB, read from /proc (None where there is no /proc)"""
+    proc = Path('/proc')
+    if not (proc / str(pid)).is_dir():
+        return None
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    parents, rss = {}, {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / 'stat').read_text()
+            statm = (entry / 'statm').read_text()
+        except OSError:
+            continue
+        # The command name in stat may contain spaces, so split after it
+        parents[int(entry.name)] = int(stat.rsplit(')', 1)[1].split()[1])
+        rss[int(entry.name)] = int(statm.split()[1]) * page_size
+    tree = {pid}
+    while True:
+        children = {child for child, parent in parents.items() if parent in tree} - tree
+        if not children:
+            break
+        tree |= children
+    return sum(rss.get(member, 0) for member in tree) / (1024 * 1024)
+
+
+def run_build(root: str, jobs: int, incremental: bool) -> Dict:
+    """Run one build in this process and report its cost (child side)"""
+    from generator import BookGen
+
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        BookGen(root).build(incremental=incremental, jobs=jobs)
+    return {'wall_seconds': time.perf_counter() - start, 'max_process_rss_mb': max_process_rss_mb()}
+
+
+def measure(root: Path, jobs: int, incremental: bool) -> Dict:
+    """Run a build in a fresh interpreter so peak RSS is per build. The RSS
+    of its whole process tree (the build and its workers) is sampled while
+    it runs, for the peak total across processes."""
+    command = [sys.executable, __file__, '_build', str(root), '--jobs', str(jobs)]
+    if incremental:
+        command.append('--incremental')
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    peak = [None]
+    
+    def sample():
+        while process.poll() is None:
+            current = tree_rss_mb(process.pid)
+            if current is not None:
+                peak[0] = max(peak[0] or 0.0, current)
+            time.sleep(RSS_SAMPLE_SECONDS)
+    
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    stdout, stderr = process.communicate()
+    sampler.join()
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+    measured = json.loads(stdout.strip().splitlines()[-1])
+    measured['process_seconds'] = time.perf_counter() - start
+    measured['tree_rss_mb'] = peak[0]
+    return measured
+
+
+def benchmark(sizes: List[int], jobs: int, workdir: Path, seed: int) -> List[Dict]:
+    """Cold and warm builds for each book size"""
+    results = []
+    for size in sizes:
+        root = workdir / f"book-{size}"
+        print(f"📚 Generating synthetic book with {size} pages...")
+        generate_book(root, size, seed)
+        pages = size + 1  # plus the home page
+
+        # Cold: clean tree, no manifest or caches. Warm: an incremental
+        # rebuild reusing everything the cold build left behind.
+        for mode, incremental in (('cold', False), ('warm', True)):
+            if mode == 'cold':
+                shutil.rmtree(root / "_book", ignore_errors=True)
+                shutil.rmtree(root / ".bookgen-cache", ignore_errors=True)
+            print(f"⏱️  {mode} build of {size} pages...")
+            measured = measure(root, jobs, incremental)
+            results.append({
+                'pages': pages,
+                'mode': mode,
+                'jobs': jobs,
+                'wall_seconds': round(measured['wall_seconds'], 4),
+                'process_seconds': round(measured['process_seconds'], 4),
+                'pages_per_second': round(pages / measured['wall_seconds'], 1),
+                'max_process_rss_mb': round(measured['max_process_rss_mb'], 1),
+                'tree_rss_mb': None if measured['tree_rss_mb'] is None else round(measured['tree_rss_mb'], 1),
+            })
+    return results
+
+
+def print_table(results: List[Dict]):
+    """Human-readable results: peak RSS of the largest single process and,
+    where it can be sampled, of the whole process tree"""
+    print(f"\n{'pages':>7} {'mode':>5} {'jobs':>4} {'build s':>9} {'process s':>10} "
+          f"{'pages/s':>9} {'max proc MiB':>13} {'tree MiB':>9}")
+    for row in results:
+        tree = '-' if row['tree_rss_mb'] is None else f"{row['tree_rss_mb']:.1f}"
+        print(f"{row['pages']:>7} {row['mode']:>5} {row['jobs']:>4} {row['wall_seconds']:>9.2f} "
+              f"{row['process_seconds']:>10.2f} {row['pages_per_second']:>9.1f} "
+              f"{row['max_process_rss_mb']:>13.1f} {tree:>9}")
+
+
+def main():
+    """Main entry point"""
+    if len(sys.argv) > 1 and sys.argv[1] == '_build':
+        parser = argparse.ArgumentParser()
+        parser.add_argument('command')
+        parser.add_argument('root_dir')
+        parser.add_argument('--jobs', type=int, default=1)
+        parser.add_argument('--incremental', action='store_true')
+        args = parser.parse_args()
+        print(json.dumps(run_build(args.root_dir, args.jobs, args.incremental)))
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark BookGen on synthetic books")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000],
+                        help="number of pages per synthetic book (default: 100 1000)")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="worker processes passed to BookGen.build (0 = one per CPU)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the synthetic content")
+    parser.add_argument('--workdir', help="where to generate the books (default: a temporary directory)")
+    parser.add_argument('--output', metavar='PATH', help="also write the results as JSON")
+    args = parser.parse_args()
+    jobs = args.jobs or os.cpu_count() or 1
+
+    if args.workdir:
+        results = benchmark(args.sizes, jobs, Path(args.workdir), args.seed)
+    else:
+        with tempfile.TemporaryDirectory(prefix="bookgen-bench-") as workdir:
+            results = benchmark(args.sizes, jobs, Path(workdir), args.seed)
+
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📄 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,11 @@ python3 -c "import markdown" 2>/dev/null || {
     pip3 install markdown --break-system-packages || pip3 install markdown --user
 }
 
-# Run the generator
-python3 .bookgen/generator.py .
+# Run the generator, through the warm daemon when one is running
+if [ -S .bookgen-cache/daemon.sock ]; then
+    python3 .bookgen/client.py . "$@"
+else
+    python3 .bookgen/generator.py . "$@"
+fi
 
 echo "✅ Build complete!"
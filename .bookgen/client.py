@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+BookGen Client
+Asks a running BookGen daemon (generator.py daemon) for a build and streams
+its output. Only the standard library is imported, so a request costs little
+more than interpreter startup.
+"""
+
+import os
+import sys
+import json
+import stat
+import socket
+import argparse
+from pathlib import Path
+
+# Must match DAEMON_SOCKET and DAEMON_STATUS in generator.py
+DAEMON_SOCKET = ".bookgen-cache/daemon.sock"
+DAEMON_STATUS = '\x00'
+
+GENERATOR = Path(__file__).with_name('generator.py')
+
+
+def request(socket_path: Path, payload: dict) -> int:
+    """Send one request, echo the streamed output and return the exit code"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        client.sendall((json.dumps(payload) + '\n').encode('utf-8'))
+        with client.makefile('r', encoding='utf-8') as responses:
+            for line in responses:
+                if line.startswith(DAEMON_STATUS):
+                    return json.loads(line[1:])['exit']
+                sys.stdout.write(line)
+                sys.stdout.flush()
+    print("❌ Error: the daemon closed the connection before the build finished")
+    return 1
+
+
+def remove_stale_socket(socket_path: Path):
+    """Delete a socket no daemon listens on any more (left by a killed one)"""
+    try:
+        if stat.S_ISSOCK(socket_path.lstat().st_mode):
+            socket_path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def build_without_daemon(argv: list, reason: str):
+    """Replace this process with a plain generator.py build.
+    
+    Used when no daemon is listening, and for options such as --no-cache or
+    --precompress, which configure the daemon's generator when it starts so
+    a request cannot change them.
+    """
+    print(f"ℹ️  {reason}, building with generator.py instead...")
+    forwarded = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == '--socket':
+            skip = True
+        elif not arg.startswith('--socket='):
+            forwarded.append(arg)
+    sys.stdout.flush()
+    os.execv(sys.executable, [sys.executable, str(GENERATOR), 'build'] + forwarded)
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Trigger a build on a running BookGen daemon")
+    parser.add_argument('root_dir', nargs='?', default='.',
+                        help="book root the daemon was started for (default: .)")
+    parser.add_argument('--socket', metavar='PATH',
+                        help=f"daemon socket (default: <root_dir>/{DAEMON_SOCKET})")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only re-render pages whose inputs changed since the last build")
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help="worker processes for this build (default: the daemon's --jobs)")
+    parser.add_argument('--strict-links', action='store_true',
+                        help="fail the build when internal links or anchors are broken")
+    parser.add_argument('--profile', action='store_true',
+                        help="time each build stage, page and Markdown extension")
+    parser.add_argument('--profile-output', metavar='PATH', help="where to write the JSON profile")
+    parser.add_argument('--deploy-manifest', metavar='PATH',
+                        help="where to write the added/changed/removed file list")
+    parser.add_argument('--stop', action='store_true', help="shut the daemon down instead of building")
+    args, extra = parser.parse_known_args()
+    if extra:
+        if args.stop:
+            parser.error(f"unrecognized arguments: {' '.join(extra)}")
+        build_without_daemon(sys.argv[1:], f"The daemon can't take {' '.join(extra)}")
+    
+    socket_path = Path(args.socket) if args.socket else Path(args.root_dir) / DAEMON_SOCKET
+    if args.stop:
+        payload = {'command': 'stop'}
+    else:
+        # Paths are resolved here, since the daemon may run in another directory
+        payload = {
+            'command': 'build',
+            'incremental': args.incremental,
+            'jobs': args.jobs,
+            'strict_links': args.strict_links,
+            'profile': args.profile,
+            'profile_output': str(Path(args.profile_output).resolve()) if args.profile_output else None,
+            'deploy_manifest': str(Path(args.deploy_manifest).resolve()) if args.deploy_manifest else None,
+        }
+    
+    try:
+        code = request(socket_path, payload)
+    except (FileNotFoundError, ConnectionRefusedError):
+        remove_stale_socket(socket_path)
+        if not args.stop:
+            build_without_daemon(sys.argv[1:], f"No BookGen daemon is listening on {socket_path}")
+        print(f"❌ Error: no BookGen daemon is listening on {socket_path}")
+        code = 2
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
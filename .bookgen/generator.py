@@ -4,36 +4,2218 @@ BookGen - A Modern GitBook Alternative
 A lightweight static site generator that mirrors GitBook features
 """
 
+import io
 import os
 import re
+import sys
+import gzip
+import html
 import json
+import math
+import time
+import posixpath
+import ctypes
+import shutil
+import socket
+import struct
+import tarfile
+import zipfile
+import filecmp
+import heapq
+import hashlib
+import threading
+import socketserver
+import subprocess
+import csv
 import markdown
+from markdown.extensions.toc import slugify
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager, nullcontext, redirect_stdout
+from functools import partial, wraps
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+from datetime import datetime, timezone
+from urllib.parse import quote, unquote
+from typing import Callable, Iterable, Iterator, List, Dict, Set, Tuple, Optional
+
+try:
+    import brotli
+except ImportError:  # optional: only needed for .br siblings with --precompress
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # optional: only needed for resized WebP/AVIF image variants
+    Image = None
+
+try:
+    import numpy
+except ImportError:  # optional: related pages are scored in pure Python without it
+    numpy = None
+
+try:
+    import zstandard
+except ImportError:  # optional: --output-backend tar falls back to .tar.gz without it
+    zstandard = None
+
+# Bump when the manifest layout changes so old manifests force a full rebuild
+MANIFEST_VERSION = 1
+
+# Markdown extensions similar to GitBook
+MARKDOWN_EXTENSIONS = [
+    'fenced_code',
+    'tables',
+    'toc',
+    'codehilite',
+    'nl2br',
+    'sane_lists',
+    'meta',
+    'attr_list',
+    'def_list',
+    'footnotes',
+    'admonition'
+]
+
+# Extension options; css_class is shared with the generated highlight.css
+MARKDOWN_EXTENSION_CONFIGS = {
+    'codehilite': {'css_class': 'codehilite'},
+}
+
+
+# Bump when render_markdown's output changes for the same Markdown input
+RENDER_CACHE_VERSION = 1
+
+# Bump when the page records analyze_page writes change shape or content
+PAGE_RECORD_VERSION = 1
+
+# Default size bound of the on-disk render cache
+RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Bump when CodeHilite's output changes for the same code block
+HIGHLIGHT_CACHE_VERSION = 1
+
+# Highlighted blocks kept in memory across the pages of one process
+HIGHLIGHT_MEMORY_ENTRIES = 4096
+
+# Pygments styles used for highlight.css unless book.json picks others
+# (pluginsConfig.highlight.style / pluginsConfig.highlight.darkStyle)
+PYGMENTS_STYLE = 'default'
+PYGMENTS_DARK_STYLE = 'monokai'
+
+# Widths of the resized variants written for each content image
+IMAGE_WIDTHS = (480, 960, 1600)
+
+# Rendered width of content images, for the srcset ``sizes`` attribute
+IMAGE_SIZES = '(max-width: 768px) 100vw, 780px'
+
+# Encoder quality of the WebP/AVIF variants
+IMAGE_QUALITY = 80
+
+# Rendered pages larger than this (in characters of HTML) are split into parts
+PAGINATE_MAX_BYTES = 128 * 1024
+
+# Compression levels for the precompressed .gz/.br siblings
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+ZSTD_LEVEL = 19
+
+# Visited pages (and other non-asset files) the service worker keeps cached
+SERVICE_WORKER_MAX_PAGES = 200
+
+# Default page weight budget of `bookgen audit`, in uncompressed HTML bytes
+AUDIT_BUDGET_BYTES = 256 * 1024
+
+# Columns of the audit report, in order (all but path are byte counts)
+AUDIT_COLUMNS = ('path', 'total', 'shell', 'sidebar', 'toc', 'content', 'highlight', 'gzip', 'brotli')
+
+# Where a build's output goes: the _book directory, or packed into a
+# tar/zip archive or a content-addressed store (see pack_output)
+OUTPUT_BACKENDS = ('dir', 'tar', 'zip', 'store')
+
+# Already compressed outputs, stored without deflating again in zip archives
+COMPRESSED_SUFFIXES = {'.gz', '.br', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.woff', '.woff2'}
+
+# Terms shorter than this are left out of the search index
+MIN_SEARCH_TERM = 2
+
+# Related pages listed under each page (book.json pluginsConfig.related.count
+# overrides it; 0 turns the block off)
+RELATED_PAGES = 5
+# Heaviest TF-IDF terms kept per page; the tail adds little but scoring cost
+RELATED_TERMS = 64
+# Most frequent terms whose counts a page record keeps for scoring, which
+# bounds what a build holds in memory per page
+RELATED_RECORD_TERMS = 256
+# Pages less similar than this (cosine) are never listed as related
+RELATED_MIN_SCORE = 0.05
+# Query pages scored per NumPy batch, bounding the dense score matrix
+RELATED_BATCH = 256
+RELATED_CACHE_VERSION = 2
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase search terms (mirrors tokenize() in script.js)"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def hash_bytes(data: bytes) -> str:
+    """Return the hex SHA-256 digest of data"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    """Return the hex SHA-256 digest of a file, or '' if it does not exist"""
+    if not path.exists():
+        return ''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def git_commit_times(root_dir: Path, wanted: Set[str]) -> Dict[str, int]:
+    """Last commit time of each wanted path (relative to root_dir) from one
+    ``git log`` pass, stopping as soon as every path has been seen. The walk
+    is limited to the wanted paths, so untracked or newly added ones do not
+    cost a diff of every commit in the history."""
+    if not wanted:
+        return {}
+    command = ['git', '--literal-pathspecs', '-c', 'core.quotePath=false', '-C', str(root_dir), 'log',
+               '--format=%x00%ct', '--name-only', '--relative', '--no-renames', '--'] + sorted(wanted)
+    try:
+        log = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True, encoding='utf-8')
+    except OSError:  # git is not installed
+        return {}
+    
+    times = {}
+    commit_time = None
+    with log:
+        for line in log.stdout:
+            line = line.rstrip('\n')
+            if line.startswith('\0'):
+                commit_time = int(line[1:])
+            elif line in wanted and line not in times:
+                times[line] = commit_time
+                if len(times) == len(wanted):
+                    log.kill()
+                    break
+    return times
+
+
+def format_timestamp(epoch: int) -> str:
+    """Footer timestamp, in UTC so it does not depend on the build machine"""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+
+
+def same_contents(a: Path, b: Path) -> bool:
+    """Whether two files hold the same bytes (hard links trivially do)"""
+    if os.path.samefile(a, b):
+        return True
+    return os.path.getsize(a) == os.path.getsize(b) and filecmp.cmp(a, b, shallow=False)
+
+
+def link_or_copy(source: str, target: str):
+    """Hard-link a file, falling back to a copy that keeps its mtime"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def list_files(directory: Path) -> Set[str]:
+    """Paths of every file under a directory, relative to it"""
+    files = set()
+    for dirpath, _, filenames in os.walk(directory):
+        relative = os.path.relpath(dirpath, directory)
+        for name in filenames:
+            files.add(posixpath.normpath(posixpath.join(relative.replace(os.sep, '/'), name)))
+    return files
+
+
+def swap_directories(staging: Path, target: Path):
+    """Replace target with staging, leaving the old tree in staging.
+    
+    On Linux both names are exchanged in one renameat2(RENAME_EXCHANGE)
+    call, so readers of target always see a complete tree. Elsewhere (or on
+    filesystems without exchange support) two renames leave target missing
+    for an instant.
+    """
+    if target.exists():
+        renameat2 = getattr(ctypes.CDLL(None, use_errno=True), 'renameat2', None) if os.name == 'posix' else None
+        if renameat2 is not None:
+            AT_FDCWD, RENAME_EXCHANGE = -100, 2
+            if renameat2(AT_FDCWD, os.fsencode(staging), AT_FDCWD, os.fsencode(target), RENAME_EXCHANGE) == 0:
+                return
+        retired = staging.with_name(f"{staging.name}.old")
+        if retired.exists():
+            shutil.rmtree(retired)
+        os.rename(target, retired)
+        os.rename(staging, target)
+        os.rename(retired, staging)
+    else:
+        os.rename(staging, target)
+
+
+class TarOutput:
+    """Packs output files into a .tar.zst stream (.tar.gz for any other
+    file name). A file whose bytes were already packed becomes a hard-link
+    member pointing at the first copy instead of a second copy."""
+    
+    def __init__(self, path: Path, mtime: int):
+        self.path = path
+        self.mtime = mtime
+        self.stack = ExitStack()
+        self.temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        f = self.stack.enter_context(open(self.temp, 'wb'))
+        if path.suffix == '.zst':
+            stream = self.stack.enter_context(zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(f))
+        else:
+            # No file name or mtime in the header keeps the archive reproducible
+            stream = self.stack.enter_context(gzip.GzipFile(filename='', mode='wb', fileobj=f,
+                                                            compresslevel=GZIP_LEVEL, mtime=0))
+        self.tar = self.stack.enter_context(tarfile.open(fileobj=stream, mode='w|', format=tarfile.PAX_FORMAT))
+    
+    def add(self, relative: str, data: Optional[bytes], digest: str, original: str):
+        info = tarfile.TarInfo(relative)
+        info.mtime = self.mtime
+        info.mode = 0o644
+        if original != relative:
+            info.type = tarfile.LNKTYPE
+            info.linkname = original
+            self.tar.addfile(info)
+            return
+        info.size = len(data)
+        self.tar.addfile(info, io.BytesIO(data))
+    
+    def carry(self, carried: Dict[str, str], previous: Dict[str, str], add: Callable):
+        """Copy the ``carried`` files out of the previous archive in one pass.
+        Each digest is stored there once as a regular member; the other
+        paths holding it are links, so only regular members are read."""
+        wanted: Dict[str, List[str]] = {}
+        for relative, digest in sorted(carried.items()):
+            wanted.setdefault(digest, []).append(relative)
+        with ExitStack() as stack:
+            f = stack.enter_context(open(self.path, 'rb'))
+            if self.path.suffix == '.zst':
+                f = stack.enter_context(zstandard.ZstdDecompressor().stream_reader(f))
+            else:
+                f = stack.enter_context(gzip.GzipFile(fileobj=f, mode='rb'))
+            archive = stack.enter_context(tarfile.open(fileobj=f, mode='r|'))
+            for member in archive:
+                relatives = wanted.pop(previous.get(member.name), None) if member.isfile() else None
+                if relatives:
+                    data = archive.extractfile(member).read()
+                    for relative in relatives:
+                        add(relative, data)
+    
+    def close(self):
+        self.stack.close()
+        os.replace(self.temp, self.path)
+
+
+class ZipOutput:
+    """Packs output files into a zip archive. Zip members cannot share
+    data, so duplicates are stored again; files that are already
+    compressed are stored rather than deflated."""
+    
+    def __init__(self, path: Path, mtime: int):
+        self.path = path
+        self.date_time = max(datetime.fromtimestamp(mtime, timezone.utc),
+                             datetime(1980, 1, 1, tzinfo=timezone.utc)).timetuple()[:6]
+        self.temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        self.zip = zipfile.ZipFile(self.temp, 'w')
+    
+    def add(self, relative: str, data: Optional[bytes], digest: str, original: str):
+        info = zipfile.ZipInfo(relative, self.date_time)
+        info.external_attr = 0o644 << 16
+        stored = posixpath.splitext(relative)[1].lower() in COMPRESSED_SUFFIXES
+        info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+        self.zip.writestr(info, data)
+    
+    def carry(self, carried: Dict[str, str], previous: Dict[str, str], add: Callable):
+        """Copy the ``carried`` files out of the previous archive"""
+        with zipfile.ZipFile(self.path) as archive:
+            for relative in sorted(carried):
+                add(relative, archive.read(relative))
+    
+    def close(self):
+        self.zip.close()
+        os.replace(self.temp, self.path)
+
+
+class ContentStore:
+    """Content-addressed output: each distinct file is stored once as
+    ``objects/<ab>/<sha256>`` and ``index.json`` maps every output path to
+    its object. Objects no longer referenced by the index are removed."""
+    
+    def __init__(self, path: Path, mtime: int):
+        self.path = path
+        self.objects = path / "objects"
+        self.index: Dict[str, str] = {}
+    
+    def object_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest
+    
+    def add(self, relative: str, data: Optional[bytes], digest: str, original: str):
+        self.index[relative] = digest
+        target = self.object_path(digest)
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            temp = target.with_name(f"{digest}.{os.getpid()}.tmp")
+            temp.write_bytes(data)
+            os.replace(temp, target)
+    
+    def carry(self, carried: Dict[str, str], previous: Dict[str, str], add: Callable):
+        """Keep the ``carried`` files, whose objects are already stored"""
+        for relative, digest in sorted(carried.items()):
+            if self.object_path(digest).exists():
+                add(relative, None, digest)
+    
+    def close(self):
+        index_path = self.path / "index.json"
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        temp = index_path.with_name(f"index.json.{os.getpid()}.tmp")
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=2, sort_keys=True)
+        os.replace(temp, index_path)
+        
+        referenced = {self.object_path(digest) for digest in self.index.values()}
+        for relative in list_files(self.objects) if self.objects.exists() else ():
+            if self.objects / relative not in referenced:
+                (self.objects / relative).unlink()
+
+
+class PackedOutput:
+    """Output of a packed build, written straight into a TarOutput,
+    ZipOutput or ContentStore instead of a staging tree.
+    
+    ``previous`` maps the files of the last packed build to their digests.
+    Those not written again (pages an incremental build skips) and not
+    removed are carried over from the previous archive on close().
+    """
+    
+    def __init__(self, backend, previous: Dict[str, str]):
+        self.backend = backend
+        self.previous = previous
+        self.carried = dict(previous)
+        self.index: Dict[str, str] = {}
+        self.originals: Dict[str, str] = {}
+    
+    def add(self, relative: str, data: Optional[bytes], digest: Optional[str] = None):
+        """Pack a file (``data`` may be None when the backend already holds ``digest``)"""
+        digest = digest or hash_bytes(data)
+        self.carried.pop(relative, None)
+        if self.index.get(relative) == digest:
+            return
+        self.index[relative] = digest
+        self.backend.add(relative, data, digest, self.originals.setdefault(digest, relative))
+    
+    def exists(self, relative: str) -> bool:
+        return relative in self.index or relative in self.carried
+    
+    def remove(self, relative: str):
+        """Drop a file of the previous build (written files cannot be unpacked)"""
+        self.carried.pop(relative, None)
+    
+    def files(self) -> Dict[str, str]:
+        """Digest of every file the packed build will hold"""
+        return {**self.carried, **self.index}
+    
+    def close(self) -> Dict[str, str]:
+        """Carry over the remaining files and finish the archive, returning its index"""
+        if self.carried:
+            self.backend.carry(dict(self.carried), self.previous, self.add)
+        self.backend.close()
+        return self.index
+
+
+class PendingOutput:
+    """Stand-in for PackedOutput in worker processes: files are collected
+    and handed back with the task's result (see drain()), and the parent
+    packs them in task order"""
+    
+    def __init__(self, previous: Dict[str, str]):
+        self.previous = previous
+        self.written: Set[str] = set()
+        self.pending: List[Tuple[str, bytes]] = []
+    
+    def add(self, relative: str, data: bytes):
+        self.written.add(relative)
+        self.pending.append((relative, data))
+    
+    def exists(self, relative: str) -> bool:
+        return relative in self.written or relative in self.previous
+    
+    def drain(self) -> List[Tuple[str, bytes]]:
+        pending, self.pending = self.pending, []
+        return pending
+
+
+CSS_COMMENTS = re.compile(r'/\*.*?\*/', re.DOTALL)
+CSS_STRINGS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+
+
+def minify_css(css: str) -> str:
+    """Strip comments and insignificant whitespace from CSS, leaving strings intact"""
+    parts = CSS_STRINGS.split(CSS_COMMENTS.sub('', css))
+    for i in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[i])
+        part = re.sub(r'\s*([{};,>])\s*', r'\1', part)
+        part = re.sub(r':\s+', ':', part)
+        parts[i] = part.replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+# Characters after which a '/' starts a regex literal rather than a division
+JS_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^') | {''}
+JS_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'throw', 'delete', 'new')
+JS_LINE_BREAKS = re.compile(r'[ \t\r]*\n[ \t\r\n]*')
+
+
+def _js_literal_end(js: str, i: int) -> int:
+    """End of the string, template or regex literal starting at js[i]. The
+    ${...} expressions of a template literal are part of it."""
+    quote = '/' if js[i] == '/' else js[i]
+    in_class = False
+    i += 1
+    while i < len(js):
+        char = js[i]
+        if char == '\\':
+            i += 2
+            continue
+        if quote == '/':
+            if char == '[':
+                in_class = True
+            elif char == ']':
+                in_class = False
+            elif char == '/' and not in_class:
+                return i + 1
+        elif char == quote:
+            return i + 1
+        elif quote == '`' and js.startswith('${', i):
+            i = _js_expression_end(js, i + 2)
+            continue
+        i += 1
+    return len(js)
+
+
+def _js_expression_end(js: str, i: int) -> int:
+    """Index after the '}' closing a template literal's ${ at js[i - 2]"""
+    depth = 0
+    while i < len(js):
+        char = js[i]
+        if char in '"\'`':
+            i = _js_literal_end(js, i)
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            if not depth:
+                return i + 1
+            depth -= 1
+        i += 1
+    return len(js)
+
+
+def minify_js(js: str) -> str:
+    """Conservatively shrink JavaScript: drop comments, indentation and blank
+    lines. String, template and regex literals are copied untouched, and line
+    breaks are kept so semicolon insertion behaves exactly as before."""
+    out = []
+    code = []
+    start = i = 0
+    # Whether the code so far ends in a literal, after which '/' divides
+    after_literal = False
+    
+    def flush(end: int):
+        code.append(js[start:end])
+        out.append(JS_LINE_BREAKS.sub('\n', ''.join(code)))
+        code.clear()
+    
+    while i < len(js):
+        char = js[i]
+        if char == '/' and js.startswith(('//', '/*'), i):
+            code.append(js[start:i])
+            if js[i + 1] == '/':
+                end = js.find('\n', i)
+                i = len(js) if end < 0 else end
+            else:
+                end = js.find('*/', i + 2)
+                end = len(js) if end < 0 else end + 2
+                # A comment spanning lines still separates statements
+                code.append('\n' if '\n' in js[i:end] else ' ')
+                i = end
+            start = i
+            continue
+        if char in '"\'`' or char == '/' and _js_regex_allowed(''.join(code) + js[start:i], after_literal):
+            flush(i)
+            end = _js_literal_end(js, i)
+            out.append(js[i:end])
+            start = i = end
+            after_literal = True
+            continue
+        if not char.isspace():
+            after_literal = False
+        i += 1
+    flush(len(js))
+    return ''.join(out).strip() + '\n'
+
+
+def _js_regex_allowed(before: str, after_literal: bool = False) -> bool:
+    """Whether a '/' following the code ``before`` (since the last literal,
+    if ``after_literal``) starts a regex literal"""
+    before = before.rstrip()
+    if not before and after_literal:
+        return False
+    word = re.search(r'[\w$]+$', before)
+    if word:
+        return word.group() in JS_REGEX_KEYWORDS
+    return before[-1:] in JS_REGEX_PRECEDERS
+
+
+# Elements around which whitespace never renders, so it can be dropped
+HTML_BLOCK_TAGS = (r'html|head|body|title|meta|link|div|nav|main|header|footer|aside|section|article|'
+                   r'p|ul|ol|li|dl|dt|dd|h[1-6]|table|thead|tbody|tfoot|tr|th|td|caption|'
+                   r'blockquote|hr|br|pre|figure|figcaption|source|details|summary|form|fieldset|'
+                   r'script|style|!DOCTYPE')
+# Plain ASCII whitespace only: \s would also eat non-breaking spaces. The
+# leading lookahead lets the scan skip text quickly.
+HTML_WHITESPACE = re.compile(
+    r'(?=[< \t\n\r\f])(?:'
+    r'(<(pre|code|textarea|script|style)\b.*?</\2[ \t\n\r\f]*>)'  # kept verbatim
+    rf'|[ \t\n\r\f]+(?=</?(?:{HTML_BLOCK_TAGS})\b)'
+    rf'|(</?(?:{HTML_BLOCK_TAGS})\b[^>]*>)[ \t\n\r\f]+'
+    r'|([ \t\r\f]*\n[ \t\n\r\f]*))',  # a line break and its indentation
+    re.IGNORECASE | re.DOTALL)
+
+
+def _minify_match(match) -> str:
+    verbatim, _, tag, line_break = match.groups()
+    return verbatim or tag or (' ' if line_break else '')
+
+
+def minify_html(html_content: str) -> str:
+    """Drop whitespace that does not render: around block-level tags and
+    indentation after line breaks. pre, code, textarea, script and style
+    elements are copied untouched. Only ASCII whitespace is removed, so the
+    byte savings equal the difference in length."""
+    return HTML_WHITESPACE.sub(_minify_match, html_content)
+
+
+CSS_BRACES = re.compile(r'[{}]')
+
+
+def critical_css_rules(css: str, prefixes: Tuple[str, ...]) -> str:
+    """Rules of minified CSS needed for first paint: those with a selector
+    starting with one of ``prefixes``, including inside screen @media blocks.
+    State pseudo-classes (:hover, :focus), print styles and other at-rules
+    are left to the full stylesheet."""
+    kept = []
+    start = depth = 0
+    opening = None
+    for match in CSS_BRACES.finditer(css):
+        if match.group() == '{':
+            if depth == 0:
+                opening = match.start()
+            depth += 1
+            continue
+        depth -= 1
+        if depth:
+            continue
+        prelude, body = css[start:opening], css[opening + 1:match.start()]
+        if prelude.startswith('@media') and 'print' not in prelude:
+            inner = critical_css_rules(body, prefixes)
+            if inner:
+                kept.append(f"{prelude}{{{inner}}}")
+        elif not prelude.startswith('@') and any(selector.startswith(prefixes) and ':' not in selector[1:]
+                                                 for selector in prelude.split(',')):
+            kept.append(css[start:match.end()])
+        start = match.end()
+    return ''.join(kept)
+
+
+def bounded_map(pool: ProcessPoolExecutor, func: Callable, items: Iterable,
+                window: int) -> Iterator[Tuple]:
+    """Yield (item, func(item)) in order, with at most ``window`` tasks in flight.
+    
+    Unlike Executor.map, which submits the whole iterable up front, this
+    pulls items lazily so a generator of pages is never fully materialized.
+    """
+    pending = deque()
+    for item in items:
+        pending.append((item, pool.submit(func, item)))
+        if len(pending) >= window:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+
+class BuildProfiler:
+    """Per-stage, per-page and per-Markdown-extension timings for a build.
+    
+    Stage timings are wall-clock in the process that records them, so with
+    a process pool the page stages are summed across workers. Extension
+    timings are self time: a processor that calls another (fenced_code
+    calling codehilite) is not charged for the nested call. A page timed in
+    both build passes (analysis and writing) gets one record with the sum.
+    """
+    
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.extensions: Dict[str, float] = defaultdict(float)
+        self.pages: Dict[str, Dict] = {}
+        self.bytes_written = 0
+        self._page: Optional[Dict] = None
+        self._nested: List[float] = []
+    
+    def stage(self, name: str):
+        """Context manager timing a named build stage"""
+        if not self.enabled:
+            return nullcontext()
+        return self._time_stage(name)
+    
+    @contextmanager
+    def _time_stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] += elapsed
+            if self._page is not None:
+                self._page['stages'][name] = self._page['stages'].get(name, 0.0) + elapsed
+    
+    def page(self, output: str, source: str):
+        """Context manager collecting the stages and bytes of one page"""
+        if not self.enabled:
+            return nullcontext()
+        return self._time_page(output, source)
+    
+    @contextmanager
+    def _time_page(self, output: str, source: str):
+        self._page = self.pages.setdefault(
+            output, {'output': output, 'source': source, 'stages': {}, 'bytes': 0, 'seconds': 0.0})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._page['seconds'] += time.perf_counter() - start
+            self._page = None
+    
+    def count_bytes(self, size: int):
+        """Record bytes written to the output directory"""
+        if not self.enabled:
+            return
+        self.bytes_written += size
+        if self._page is not None:
+            self._page['bytes'] += size
+    
+    def timed(self, label: str, func: Callable) -> Callable:
+        """Wrap func so its self time is charged to label"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            self._nested.append(0.0)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.extensions[label] += elapsed - self._nested.pop()
+                if self._nested:
+                    self._nested[-1] += elapsed
+        return wrapper
+    
+    def instrument(self, md: markdown.Markdown):
+        """Time every processor of a Markdown instance by the extension owning it"""
+        registries = (md.preprocessors, md.parser.blockprocessors,
+                      md.treeprocessors, md.postprocessors)
+        for registry in registries:
+            for processor in registry:
+                module = type(processor).__module__
+                extension = module.rsplit('.', 1)[-1] if '.extensions.' in module else 'core'
+                label = f"{extension}.{type(processor).__name__}"
+                processor.run = self.timed(label, processor.run)
+        
+        # Pygments highlighting runs inside fenced_code; charge it separately.
+        # The patch is class-wide, so always rebind it to the newest profiler
+        # (forked workers inherit the parent's patched class).
+        from markdown.extensions.codehilite import CodeHilite
+        original = getattr(CodeHilite.hilite, '__wrapped__', CodeHilite.hilite)
+        CodeHilite.hilite = self.timed('codehilite.CodeHilite.hilite', original)
+    
+    @staticmethod
+    def uninstrument(md: markdown.Markdown):
+        """Undo instrument(), restoring the processors' own run methods"""
+        registries = (md.preprocessors, md.parser.blockprocessors,
+                      md.treeprocessors, md.postprocessors)
+        for registry in registries:
+            for processor in registry:
+                vars(processor).pop('run', None)
+        
+        from markdown.extensions.codehilite import CodeHilite
+        CodeHilite.hilite = getattr(CodeHilite.hilite, '__wrapped__', CodeHilite.hilite)
+    
+    def drain(self) -> Dict:
+        """Hand over and reset the recorded data (used by worker processes)"""
+        data = {
+            'stages': dict(self.stages),
+            'extensions': dict(self.extensions),
+            'pages': list(self.pages.values()),
+            'bytes_written': self.bytes_written,
+        }
+        self.stages = defaultdict(float)
+        self.extensions = defaultdict(float)
+        self.pages = {}
+        self.bytes_written = 0
+        return data
+    
+    def merge(self, data: Dict):
+        """Fold in data drained from a worker process"""
+        for name, seconds in data['stages'].items():
+            self.stages[name] += seconds
+        for label, seconds in data['extensions'].items():
+            self.extensions[label] += seconds
+        for page in data['pages']:
+            record = self.pages.setdefault(page['output'], dict(page, stages={}, bytes=0, seconds=0.0))
+            record['seconds'] += page['seconds']
+            record['bytes'] += page['bytes']
+            for name, seconds in page['stages'].items():
+                record['stages'][name] = record['stages'].get(name, 0.0) + seconds
+        self.bytes_written += data['bytes_written']
+    
+    def report(self, total: float, jobs: int, slowest: int = 10) -> Dict:
+        """Build the machine-readable profile report"""
+        pages = sorted(self.pages.values(), key=lambda page: page['seconds'], reverse=True)
+        return {
+            'total_seconds': total,
+            'jobs': jobs,
+            'page_count': len(pages),
+            'bytes_written': self.bytes_written,
+            'stages': dict(sorted(self.stages.items(), key=lambda item: -item[1])),
+            'extensions': dict(sorted(self.extensions.items(), key=lambda item: -item[1])),
+            'slowest_pages': pages[:slowest],
+            'pages': sorted(pages, key=lambda page: page['output']),
+        }
+    
+    def summarize(self, report: Dict) -> str:
+        """Format a report as a short human-readable summary"""
+        total = report['total_seconds'] or 1e-9
+        lines = [f"⏱️  Build profile: {report['total_seconds']:.2f}s wall, "
+                 f"{report['page_count']} pages, {report['bytes_written'] / 1024:.1f} KiB written"]
+        if report['jobs'] > 1:
+            lines.append(f"   (page stages summed across {report['jobs']} workers)")
+        lines.append("   Stages:")
+        for name, seconds in report['stages'].items():
+            lines.append(f"     {name:<24} {seconds:8.3f}s {100 * seconds / total:6.1f}%")
+        lines.append("   Markdown extensions (self time):")
+        for label, seconds in list(report['extensions'].items())[:10]:
+            lines.append(f"     {label:<48} {seconds:8.3f}s")
+        lines.append("   Slowest pages:")
+        for page in report['slowest_pages']:
+            lines.append(f"     {page['seconds']:8.3f}s  {page['output']}")
+        return '\n'.join(lines)
+
+
+SKIPPED_ELEMENTS = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+HEADING_ELEMENTS = re.compile(r'<h[1-3]\b[^>]*>(.*?)</h[1-3]\s*>', re.IGNORECASE | re.DOTALL)
+TAGS = re.compile(r'<[^>]*>')
+
+
+def extract_search_document(content_html: str) -> Dict:
+    """Reduce rendered page content to its searchable text.
+    
+    Body text is kept in document order as terms so the index can record
+    positions; heading text (h1-h3) is additionally collected on its own.
+    """
+    content_html = SKIPPED_ELEMENTS.sub(' ', content_html)
+    headings = set()
+    for heading in HEADING_ELEMENTS.findall(content_html):
+        headings.update(tokenize(html.unescape(TAGS.sub(' ', heading))))
+    body = tokenize(html.unescape(TAGS.sub(' ', content_html)))
+    return {'body': body, 'headings': sorted(headings)}
+
+
+class RenderCache:
+    """On-disk cache of rendered Markdown, shared by every render_markdown caller.
+    
+    Entries are keyed on the source bytes plus everything else that affects
+    the output: the extension list and options and the Markdown and Pygments
+    versions. Hits refresh an entry's mtime so prune() can evict the least
+    recently used entries once the cache outgrows ``max_bytes``.
+    """
+    
+    def __init__(self, cache_dir: Path, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.salt = self.compute_salt()
+    
+    @staticmethod
+    def compute_salt() -> str:
+        """Everything besides the source that feeds the rendered output"""
+        try:
+            import pygments
+            pygments_version = pygments.__version__
+        except ImportError:
+            pygments_version = None
+        return json.dumps({
+            'version': RENDER_CACHE_VERSION,
+            'extensions': MARKDOWN_EXTENSIONS,
+            'configs': MARKDOWN_EXTENSION_CONFIGS,
+            'markdown': markdown.__version__,
+            'pygments': pygments_version,
+        }, sort_keys=True)
+    
+    def key(self, content: bytes) -> str:
+        """Cache key for a source file's bytes"""
+        return hash_bytes(self.salt.encode('utf-8') + b'\0' + content)
+    
+    def path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+    
+    def get(self, key: str) -> Optional[Tuple[str, Dict]]:
+        """Rendered (html, metadata) for a key, or None on a miss"""
+        path = self.path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry['html'], entry['meta']
+    
+    def put(self, key: str, html_content: str, metadata: Dict):
+        """Store a rendered page; written atomically so workers can share the cache"""
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'html': html_content, 'meta': metadata}, f, separators=(',', ':'))
+        os.replace(temp, path)
+    
+    def prune(self) -> int:
+        """Evict least recently used entries until the cache fits; returns evicted count"""
+        if not self.cache_dir.exists():
+            return 0
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*/*.json"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink()
+            total -= size
+            evicted += 1
+        return evicted
+
+
+class HighlightCache(RenderCache):
+    """Highlighted code blocks shared across pages, in memory and on disk.
+    
+    Cookbooks repeat the same snippets on many pages, and lexer guessing for
+    blocks without a language dominates highlighting time. Entries are keyed
+    on the code and every CodeHilite option that shapes the markup, so a hit
+    is exactly what CodeHilite.hilite would have returned.
+    """
+    
+    # The cache consulted by the patched CodeHilite.hilite in this process
+    active: Optional['HighlightCache'] = None
+    
+    def __init__(self, cache_dir: Path, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        super().__init__(cache_dir, max_bytes)
+        self.memory: 'OrderedDict[str, str]' = OrderedDict()
+    
+    @staticmethod
+    def compute_salt() -> str:
+        """Library versions that feed the highlighted markup"""
+        try:
+            import pygments
+            pygments_version = pygments.__version__
+        except ImportError:
+            pygments_version = None
+        return json.dumps({
+            'version': HIGHLIGHT_CACHE_VERSION,
+            'markdown': markdown.__version__,
+            'pygments': pygments_version,
+        }, sort_keys=True)
+    
+    def block_key(self, block, shebang: bool) -> str:
+        """Cache key for a CodeHilite instance about to be highlighted"""
+        formatter = block.pygments_formatter
+        if not isinstance(formatter, str):
+            formatter = f"{formatter.__module__}.{formatter.__qualname__}"
+        parts = [self.salt, block.lang or '', str(block.guess_lang), str(block.use_pygments),
+                 block.lang_prefix, formatter, repr(sorted(block.options.items())),
+                 str(shebang), block.src]
+        return self.key('\0'.join(parts).encode('utf-8'))
+    
+    def get(self, key: str) -> Optional[str]:
+        """Highlighted markup for a key, or None on a miss"""
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+        cached = super().get(key)
+        if cached is not None:
+            self.remember(key, cached[0])
+            return cached[0]
+        return None
+    
+    def put(self, key: str, html_content: str):
+        self.remember(key, html_content)
+        super().put(key, html_content, {})
+    
+    def remember(self, key: str, html_content: str):
+        self.memory[key] = html_content
+        if len(self.memory) > HIGHLIGHT_MEMORY_ENTRIES:
+            self.memory.popitem(last=False)
+
+
+def install_highlight_cache():
+    """Route CodeHilite.hilite through HighlightCache.active, once per process.
+    
+    fenced_code and codehilite both highlight through this method. The
+    wrapper deliberately has no __wrapped__, so BuildProfiler times it
+    (cache lookups included) instead of unwrapping past it.
+    """
+    from markdown.extensions.codehilite import CodeHilite
+    hilite = getattr(CodeHilite.hilite, '__wrapped__', CodeHilite.hilite)
+    if getattr(hilite, 'highlight_cache', False):
+        return
+    
+    def cached_hilite(block, shebang: bool = True) -> str:
+        cache = HighlightCache.active
+        if cache is None:
+            return hilite(block, shebang)
+        key = cache.block_key(block, shebang)
+        cached = cache.get(key)
+        if cached is None:
+            cached = hilite(block, shebang)
+            cache.put(key, cached)
+        return cached
+    
+    cached_hilite.highlight_cache = True
+    CodeHilite.hilite = cached_hilite
+
+
+LINK_ELEMENTS = re.compile(r'(<a\b[^>]*?\bhref=")([^"]*)(")', re.IGNORECASE)
+ID_ATTRIBUTES = re.compile(r'\bid="([^"]*)"')
+EXTERNAL_URL = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.-]*:|//)')
+
+
+def is_internal_link(href: str) -> bool:
+    """True for links into the book itself (relative, root-relative or #anchor)"""
+    return bool(href) and not EXTERNAL_URL.match(href)
+
+
+def rewrite_links(content_html: str) -> str:
+    """Point internal links at .md sources to the .html pages built from them"""
+    def rewrite(match):
+        href = match.group(2)
+        if is_internal_link(href):
+            path, hash_mark, fragment = href.partition('#')
+            path, question_mark, query = path.partition('?')
+            if path.lower().endswith('.md'):
+                href = f"{path[:-3]}.html{question_mark}{query}{hash_mark}{fragment}"
+        return match.group(1) + href + match.group(3)
+    
+    return LINK_ELEMENTS.sub(rewrite, content_html)
+
+
+def extract_links(content_html: str) -> Tuple[List[str], List[str]]:
+    """Heading/element ids and distinct internal link targets of page content"""
+    anchors = sorted({html.unescape(anchor) for anchor in ID_ATTRIBUTES.findall(content_html)})
+    links = []
+    seen = set()
+    for _, href, _ in LINK_ELEMENTS.findall(content_html):
+        href = html.unescape(href)
+        if is_internal_link(href) and href not in seen:
+            seen.add(href)
+            links.append(href)
+    return anchors, links
+
+
+H2_ELEMENTS = re.compile(r'<h2 id="([^"]*)"[^>]*>(.*?)</h2\s*>', re.IGNORECASE | re.DOTALL)
+FOOTNOTES_BLOCK = re.compile(r'<div class="footnote">.*\Z', re.DOTALL)
+FOOTNOTE_ITEMS = re.compile(r'<li id="fn:([^"]*)"')
+FOOTNOTE_REFS = re.compile(r'<a class="footnote-ref" href="#fn:([^"]*)"')
+FOOTNOTE_BACKREFS = re.compile(r'<a class="footnote-backref" href="#([^"]*)"[^>]*>.*?</a>', re.DOTALL)
+
+
+def split_footnotes(block: str) -> Tuple[str, List[Tuple[str, str]], str]:
+    """Break the footnotes extension's block into its opening markup, the
+    (id, <li>) items and its closing markup"""
+    starts = list(FOOTNOTE_ITEMS.finditer(block))
+    if not starts:
+        return block, [], ''
+    end = block.rfind('</ol>')
+    items = [(match.group(1), block[match.start():starts[index + 1].start() if index + 1 < len(starts) else end])
+             for index, match in enumerate(starts)]
+    return block[:starts[0].start()], items, block[end:]
+
+
+def part_footnotes(part_html: str, opening: str, items: List[Tuple[str, str]], closing: str,
+                   extra: Set[str] = frozenset()) -> str:
+    """The footnotes block of one part: the footnotes it references (plus
+    ``extra`` ones), keeping their numbers (``value``) and only the
+    back-links to references inside the part"""
+    refs = set(FOOTNOTE_REFS.findall(part_html)) | extra
+    ids = set(ID_ATTRIBUTES.findall(part_html))
+    kept = []
+    for number, (footnote, item) in enumerate(items, 1):
+        if footnote in refs:
+            item = FOOTNOTE_BACKREFS.sub(lambda match: match.group(0) if match.group(1) in ids else '', item)
+            kept.append(item.replace('<li ', f'<li value="{number}" ', 1))
+    return opening + ''.join(kept) + closing if kept else ''
+
+
+def split_sections(content_html: str, max_bytes: int) -> List[Dict]:
+    """Group a page's h2 sections into parts of at most ``max_bytes``.
+    
+    Splits fall only on the h2 headings the toc extension gave an id. Each
+    part is {'html', 'headings': [(id, name)], 'anchors': [every id in it]};
+    the text before the first h2 stays with the first part. A single
+    section larger than the limit becomes a part of its own. Each part gets
+    the footnotes it references (see part_footnotes); footnotes nothing
+    references stay with the first part.
+    """
+    footnotes = FOOTNOTES_BLOCK.search(content_html)
+    if footnotes:
+        content_html = content_html[:footnotes.start()]
+    starts = [(match.start(), match.group(1), TAGS.sub('', match.group(2)).strip())
+              for match in H2_ELEMENTS.finditer(content_html)]
+    
+    parts = [{'html': content_html[:starts[0][0]] if starts else content_html, 'headings': []}]
+    for index, (start, anchor, name) in enumerate(starts):
+        end = starts[index + 1][0] if index + 1 < len(starts) else len(content_html)
+        section = content_html[start:end]
+        current = parts[-1]
+        if current['headings'] and len(current['html']) + len(section) > max_bytes:
+            parts.append({'html': section, 'headings': [(anchor, name)]})
+        else:
+            current['html'] += section
+            current['headings'].append((anchor, name))
+    
+    if footnotes:
+        opening, items, closing = split_footnotes(footnotes.group(0))
+        orphans = {footnote for footnote, _ in items} - set(FOOTNOTE_REFS.findall(content_html))
+        for number, part in enumerate(parts):
+            part['html'] += part_footnotes(part['html'], opening, items, closing, orphans if number == 0 else set())
+    for part in parts:
+        part['anchors'] = sorted(set(ID_ATTRIBUTES.findall(part['html'])))
+    return parts
+
+
+AUDIT_SIDEBAR = re.compile(rb'<nav class="book-sidebar".*?</nav>', re.DOTALL)
+AUDIT_TOC = re.compile(rb'<aside class="book-toc">.*?</aside>', re.DOTALL)
+AUDIT_CONTENT = re.compile(rb'<div class="book-content">(.*?)</div>\s*<footer class="book-footer"', re.DOTALL)
+AUDIT_CODEHILITE = re.compile(rb'<div class="codehilite">.*?</pre>', re.DOTALL)
+AUDIT_SPANS = re.compile(rb'</?span\b[^>]*>')
+
+
+def page_weight(data: bytes) -> Dict[str, int]:
+    """Byte breakdown of one output page.
+    
+    ``sidebar``, ``toc`` and ``content`` are the markup of those regions,
+    ``shell`` is everything else the page template adds (head, inlined CSS,
+    header, footer) and ``highlight`` the part of ``content`` that is
+    CodeHilite's span markup around code. ``gzip`` and ``brotli`` (0
+    without the brotli package) are the compressed sizes of the page.
+    """
+    sidebar = AUDIT_SIDEBAR.search(data)
+    toc = AUDIT_TOC.search(data)
+    content = AUDIT_CONTENT.search(data)
+    content_html = content.group(1) if content else b''
+    weight = {
+        'total': len(data),
+        'sidebar': len(sidebar.group(0)) if sidebar else 0,
+        'toc': len(toc.group(0)) if toc else 0,
+        'content': len(content_html),
+        'highlight': sum(len(tag) for block in AUDIT_CODEHILITE.findall(content_html)
+                         for tag in AUDIT_SPANS.findall(block)),
+        'gzip': len(gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)),
+        'brotli': len(brotli.compress(data, quality=BROTLI_QUALITY)) if brotli else 0,
+    }
+    weight['shell'] = weight['total'] - weight['sidebar'] - weight['toc'] - weight['content']
+    return weight
+
+
+class SearchIndex:
+    """Inverted index over the pages of a build.
+    
+    Each posting is ``[doc, fields, *positions]`` where fields is a bitmask
+    (1 = title, 2 = heading, 4 = body) and body positions are
+    delta-encoded.
+    """
+    
+    def __init__(self):
+        self.docs: List[List[str]] = []
+        self.postings: Dict[str, List[List[int]]] = {}
+    
+    def add(self, url: str, title: str, document: Dict):
+        """Index one page's search document"""
+        doc_id = len(self.docs)
+        self.docs.append([url, title])
+        
+        positions: Dict[str, List[int]] = {}
+        for position, term in enumerate(document['body']):
+            positions.setdefault(term, []).append(position)
+        title_terms = set(tokenize(title))
+        heading_terms = set(document['headings'])
+        
+        for term in sorted(positions.keys() | title_terms):
+            if len(term) < MIN_SEARCH_TERM:
+                continue
+            fields = ((1 if term in title_terms else 0)
+                      | (2 if term in heading_terms else 0)
+                      | (4 if term in positions else 0))
+            posting = [doc_id, fields]
+            previous = 0
+            for position in positions.get(term, []):
+                posting.append(position - previous)
+                previous = position
+            self.postings.setdefault(term, []).append(posting)
+    
+    def shards(self) -> Dict[str, Dict[str, List]]:
+        """Postings grouped by the first two characters of each term"""
+        shards: Dict[str, Dict[str, List]] = {}
+        for term in sorted(self.postings):
+            shards.setdefault(term[:2], {})[term] = self.postings[term]
+        return shards
+
+
+class LinkIndex:
+    """Every output page with its anchors, plus the internal links between
+    them, so the whole book can be validated in one pass over the links"""
+    
+    def __init__(self, exists: Callable[[str], bool]):
+        self.exists = exists  # whether a non-page file is part of the output
+        self.anchors: Dict[str, Set[str]] = {}
+        self.links: List[Tuple[str, str]] = []
+    
+    def add(self, output: str, record: Dict):
+        """Register a page's anchors and outgoing links"""
+        self.anchors[output] = set(record['anchors'])
+        self.links.extend((output, href) for href in record['links'])
+    
+    @staticmethod
+    def resolve(output: str, href: str) -> Tuple[str, str]:
+        """Output path and anchor a link on page ``output`` points at"""
+        path, _, fragment = href.partition('#')
+        path = unquote(path.split('?', 1)[0])
+        if not path:
+            return output, unquote(fragment)
+        
+        if path.startswith('/'):
+            target = path.lstrip('/')
+        else:
+            target = posixpath.join(posixpath.dirname(output), path)
+        target = posixpath.normpath(target) if target else '.'
+        if target == '.':
+            target = 'index.html'
+        elif path.endswith('/'):
+            target = posixpath.join(target, 'index.html')
+        return target, unquote(fragment)
+    
+    def validate(self) -> Dict:
+        """Check every link against the index of pages and anchors"""
+        broken = []
+        for output, href in self.links:
+            target, anchor = self.resolve(output, href)
+            if target.startswith('..'):
+                reason = 'outside the book'
+            elif target in self.anchors:
+                if not anchor or anchor == 'top' or anchor in self.anchors[target]:
+                    continue
+                reason = 'missing anchor'
+            elif target.endswith('.html'):
+                reason = 'missing page'
+            elif self.exists(target):
+                continue
+            else:
+                reason = 'missing file'
+            broken.append({'page': output, 'href': href, 'target': target,
+                           'anchor': anchor, 'reason': reason})
+        
+        return {
+            'pages': len(self.anchors),
+            'links': len(self.links),
+            'broken': broken,
+        }
+
+
+class RelatedPages:
+    """The most similar pages of every page, by cosine similarity of TF-IDF
+    vectors over the pages' search text.
+    
+    Each vector keeps only the page's RELATED_TERMS heaviest terms, and
+    scores are accumulated through per-term postings, so the cost follows
+    the shared terms instead of every pair of pages. With NumPy installed
+    a batch of pages is scored at once; otherwise the same accumulation
+    runs in Python.
+    
+    The lists of the previous build (``.bookgen-cache/related.json``) keep
+    later builds incremental: pages whose text changed, and pages listing
+    one of them, are rescored; any other page only admits a changed page
+    that now beats its weakest neighbour. Document frequencies are taken
+    from the current build, so scores kept from earlier builds may drift
+    until a page is rescored.
+    """
+    
+    def __init__(self, state_path: Path, count: int = RELATED_PAGES):
+        self.state_path = state_path
+        self.count = count
+    
+    def load(self) -> Dict[str, Dict]:
+        """Per-page hashes and lists of the previous build, if compatible"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if state.get('version') != RELATED_CACHE_VERSION or state.get('count') != self.count:
+            return {}
+        return state['pages']
+    
+    def save(self, pages: Dict[str, Dict]):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.state_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': RELATED_CACHE_VERSION, 'count': self.count, 'pages': pages},
+                      f, separators=(',', ':'), sort_keys=True)
+    
+    @staticmethod
+    def term_counts(terms: List[str]) -> Dict[str, int]:
+        """The RELATED_RECORD_TERMS most frequent scorable terms of a page
+        with their counts, as kept in its page record"""
+        # Count first, then filter the (far fewer) distinct terms
+        counts = Counter(terms)
+        for term in [term for term in counts if len(term) < MIN_SEARCH_TERM or term.isdigit()]:
+            del counts[term]
+        return dict(counts.most_common(RELATED_RECORD_TERMS))
+    
+    @staticmethod
+    def vectorize(documents: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, float]]:
+        """Pruned, L2-normalized TF-IDF vectors (sublinear term frequency)
+        from each page's term counts (see term_counts)"""
+        frequencies = Counter()
+        for terms in documents.values():
+            frequencies.update(terms.keys())
+        total = len(documents)
+        idf = {term: math.log((1 + total) / (1 + df)) + 1 for term, df in frequencies.items()}
+        
+        vectors = {}
+        for doc, terms in documents.items():
+            weights = heapq.nlargest(RELATED_TERMS, [((1 + math.log(tf)) * idf[term], term)
+                                                    for term, tf in terms.items()])
+            norm = math.sqrt(sum(weight * weight for weight, _ in weights)) or 1.0
+            vectors[doc] = {term: weight / norm for weight, term in weights}
+        return vectors
+    
+    def update(self, documents: Dict[str, Tuple[str, Dict[str, int]]]) -> Dict[str, List[Tuple[str, float]]]:
+        """Related pages with their scores, best first, for every page.
+        ``documents`` maps each page to its (source hash, term counts)."""
+        previous = self.load()
+        changed = {doc for doc, (source_hash, _) in documents.items()
+                   if previous.get(doc, {}).get('hash') != source_hash}
+        stale = changed | (previous.keys() - documents.keys())
+        related = {doc: [tuple(pair) for pair in previous[doc]['related']]
+                   for doc in documents.keys() - changed}
+        rescore = changed | {doc for doc, pairs in related.items()
+                             if any(other in stale for other, _ in pairs)}
+        # Minimum score a changed page needs to enter a kept list
+        floors = {doc: pairs[-1][1] if len(pairs) >= self.count else RELATED_MIN_SCORE
+                  for doc, pairs in related.items() if doc not in rescore}
+        
+        if rescore:
+            vectors = self.vectorize({doc: terms for doc, (_, terms) in documents.items()})
+            score = self.score_numpy if numpy else self.score_python
+            for doc, top, admitted in score(vectors, sorted(rescore), floors if changed else {}):
+                related[doc] = top
+                if doc not in changed:
+                    continue
+                for other, similarity in admitted:
+                    pairs = related[other] + [(doc, similarity)]
+                    related[other] = sorted(pairs, key=lambda pair: (-pair[1], pair[0]))[:self.count]
+        
+        self.save({doc: {'hash': documents[doc][0], 'related': [list(pair) for pair in related[doc]]}
+                   for doc in documents})
+        return related
+    
+    def top(self, scores: Iterable[Tuple[str, float]]) -> List[Tuple[str, float]]:
+        """The best ``count`` neighbours above RELATED_MIN_SCORE, ties broken by name"""
+        candidates = ((doc, round(score, 6)) for doc, score in scores if score >= RELATED_MIN_SCORE)
+        return heapq.nsmallest(self.count, candidates, key=lambda pair: (-pair[1], pair[0]))
+    
+    def score_python(self, vectors: Dict[str, Dict[str, float]], queries: List[str],
+                     floors: Dict[str, float]) -> Iterator[Tuple[str, List, List]]:
+        """Yield (page, its top neighbours, kept pages it beats the floor of)"""
+        postings = defaultdict(list)
+        for doc in sorted(vectors):
+            for term, weight in vectors[doc].items():
+                postings[term].append((doc, weight))
+        
+        for query in queries:
+            scores = defaultdict(float)
+            for term, weight in vectors[query].items():
+                for doc, other_weight in postings[term]:
+                    scores[doc] += weight * other_weight
+            scores.pop(query, None)
+            admitted = [(doc, round(score, 6)) for doc, score in scores.items()
+                        if doc in floors and score > floors[doc]]
+            yield query, self.top(scores.items()), admitted
+    
+    def score_numpy(self, vectors: Dict[str, Dict[str, float]], queries: List[str],
+                    floors: Dict[str, float]) -> Iterator[Tuple[str, List, List]]:
+        """score_python, with a batch of query rows multiplied against the
+        term-major (CSC) matrix of all vectors at once"""
+        docs = sorted(vectors)
+        index = {doc: i for i, doc in enumerate(docs)}
+        vocabulary: Dict[str, int] = {}
+        rows, columns, values = [], [], []
+        for i, doc in enumerate(docs):
+            for term, weight in vectors[doc].items():
+                rows.append(i)
+                columns.append(vocabulary.setdefault(term, len(vocabulary)))
+                values.append(weight)
+        rows, columns, values = numpy.array(rows), numpy.array(columns), numpy.array(values)
+        order = numpy.argsort(columns, kind='stable')
+        posting_docs, posting_values = rows[order], values[order]
+        starts = numpy.searchsorted(columns[order], numpy.arange(len(vocabulary) + 1))
+        floor = numpy.full(len(docs), numpy.inf)
+        for doc, value in floors.items():
+            floor[index[doc]] = value
+        
+        for batch_start in range(0, len(queries), RELATED_BATCH):
+            batch = queries[batch_start:batch_start + RELATED_BATCH]
+            query_rows, terms, weights = [], [], []
+            for b, query in enumerate(batch):
+                for term, weight in vectors[query].items():
+                    query_rows.append(b)
+                    terms.append(vocabulary[term])
+                    weights.append(weight)
+            terms = numpy.array(terms, dtype=numpy.int64)
+            lengths = starts[terms + 1] - starts[terms]
+            # Positions of every posting of every query term, flattened
+            positions = (numpy.repeat(starts[terms] - numpy.cumsum(lengths) + lengths, lengths)
+                         + numpy.arange(lengths.sum()))
+            cells = numpy.repeat(numpy.array(query_rows) * len(docs), lengths) + posting_docs[positions]
+            products = numpy.repeat(numpy.array(weights), lengths) * posting_values[positions]
+            scores = numpy.bincount(cells, weights=products,
+                                    minlength=len(batch) * len(docs)).reshape(len(batch), len(docs))
+            
+            for b, query in enumerate(batch):
+                row = scores[b]
+                row[index[query]] = 0.0
+                best = numpy.nonzero(row >= RELATED_MIN_SCORE)[0]
+                if len(best) > self.count * 2:
+                    best = best[numpy.argpartition(-row[best], self.count * 2)[:self.count * 2]]
+                admitted = [(docs[i], round(float(row[i]), 6)) for i in numpy.nonzero(row > floor)[0]]
+                yield query, self.top((docs[i], float(row[i])) for i in best), admitted
+
+
+def collection_slug(title: str) -> str:
+    """File name stem of a tag or section page"""
+    return slugify(title, '-') or hash_bytes(title.encode('utf-8'))[:10]
+
+
+def collection_slugs(titles: Iterable[str], reserved: Iterable[str] = ()) -> Dict[str, str]:
+    """Distinct file name stems for titles, in order: a title whose slug is
+    taken ("C++" after "C") gets the first free ``-2``, ``-3``... suffix"""
+    used = set(reserved)
+    slugs = {}
+    for title in titles:
+        base = slug = collection_slug(title)
+        number = 1
+        while slug in used:
+            number += 1
+            slug = f"{base}-{number}"
+        used.add(slug)
+        slugs[title] = slug
+    return slugs
+
+
+class MetadataIndex:
+    """Front matter (the ``meta`` extension's Meta) of every page, with its
+    title, SUMMARY section and timestamp, feeding the tag pages, section
+    listings and ``catalog.json``.
+    
+    It is filled from the manifest entries of a build, which carry the
+    metadata of the render pass, so no source is read again; pages skipped
+    by an incremental build contribute the entry kept from the last one.
+    """
+    
+    def __init__(self):
+        self.pages: Dict[str, Dict] = {}
+    
+    def add(self, output: str, entry: Dict, section: Optional[str] = None):
+        """Index a page's manifest entry"""
+        self.pages[output] = {
+            'url': '/' if output == 'index.html' else '/' + output,
+            'source': entry['source'],
+            'title': entry['title'],
+            'section': section,
+            'updated': entry.get('updated'),
+            # Sorted like the manifest it may come from, for stable output
+            'meta': dict(sorted(entry.get('meta', {}).items())),
+        }
+    
+    @staticmethod
+    def tags_of(meta: Dict[str, List[str]]) -> List[str]:
+        """Tags from a ``tags:`` field, one per line or comma-separated"""
+        return [tag.strip() for line in meta.get('tags', []) for tag in line.split(',') if tag.strip()]
+    
+    def tags(self) -> Dict[str, List[str]]:
+        """Outputs by tag, both sorted"""
+        tags: Dict[str, List[str]] = {}
+        for output in sorted(self.pages):
+            for tag in self.tags_of(self.pages[output]['meta']):
+                tags.setdefault(tag, []).append(output)
+        return dict(sorted(tags.items(), key=lambda item: item[0].lower()))
+    
+    def sections(self) -> Dict[str, List[str]]:
+        """Outputs by SUMMARY section, in build order"""
+        sections: Dict[str, List[str]] = {}
+        for output, page in self.pages.items():
+            if page['section']:
+                sections.setdefault(page['section'], []).append(output)
+        return sections
+    
+    def tag_outputs(self) -> Dict[str, str]:
+        """Output path of every tag page; ``index`` is the tag index's"""
+        return {tag: f"tags/{slug}.html"
+                for tag, slug in collection_slugs(self.tags(), reserved=['index']).items()}
+    
+    def section_outputs(self) -> Dict[str, str]:
+        """Output path of every section listing"""
+        return {title: f"sections/{slug}.html" for title, slug in collection_slugs(self.sections()).items()}
+    
+    def catalog(self) -> Dict:
+        """The JSON metadata catalog"""
+        def urls(outputs: List[str]) -> List[str]:
+            return [self.pages[output]['url'] for output in outputs]
+        
+        return {
+            'pages': [self.pages[output] for output in sorted(self.pages)],
+            'tags': {tag: urls(outputs) for tag, outputs in self.tags().items()},
+            'sections': {title: urls(outputs) for title, outputs in self.sections().items()},
+        }
+
+
+IMG_ELEMENTS = re.compile(r'''<img\b(?:[^>"']|"[^"]*"|'[^']*')*>''', re.IGNORECASE)
+# name, then a double-quoted, single-quoted or unquoted value; none for booleans
+HTML_ATTRIBUTES = re.compile(r'''([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?''')
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def read_image_size(path: Path) -> Optional[Tuple[int, int]]:
+    """Width and height from a PNG, GIF, JPEG or WebP header, without decoding"""
+    with open(path, 'rb') as f:
+        head = f.read(30)
+        if head.startswith(b'\x89PNG\r\n\x1a\n'):
+            return struct.unpack('>II', head[16:24])
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            chunk = head[12:16]
+            if chunk == b'VP8 ':
+                width, height = struct.unpack('<HH', head[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b'VP8L':
+                bits = int.from_bytes(head[21:25], 'little')
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b'VP8X':
+                return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+            return None
+        if head[:2] == b'\xff\xd8':
+            # Walk the JPEG segments up to the first start-of-frame marker
+            f.seek(2)
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None
+                length = f.read(2)
+                if len(length) < 2:
+                    return None
+                if marker[1] in JPEG_SOF_MARKERS:
+                    height, width = struct.unpack('>xHH', f.read(5))
+                    return width, height
+                f.seek(struct.unpack('>H', length)[0] - 2, os.SEEK_CUR)
+    return None
+
+
+def image_variant_formats() -> Tuple[str, ...]:
+    """Variant formats Pillow can encode here, best first"""
+    if Image is None:
+        return ()
+    Image.init()
+    return tuple(name for name in ('avif', 'webp') if name.upper() in Image.SAVE)
+
+
+class ImagePipeline:
+    """Content images: hashed copies, resized WebP/AVIF variants and their dimensions.
+    
+    Every image is processed once per source hash. The resulting record
+    (dimensions and derivative files) is cached in ``cache_dir`` next to the
+    encoded derivatives, and handed to ``publish_file`` (source path, output
+    path under ``images/``) when a page needs it. Without Pillow only the hashed original is published, with
+    dimensions read from the file header.
+    """
+    
+    # Resizing and re-encoding only pays off for photographs and screenshots
+    RESIZABLE = {'.png', '.jpg', '.jpeg', '.webp'}
+    
+    def __init__(self, cache_dir: Path, publish_file: Callable[[Path, str], None], reuse: bool = True):
+        self.cache_dir = cache_dir
+        self.publish_file = publish_file
+        self.reuse = reuse
+        self.formats = image_variant_formats()
+        self.records: Dict[str, Dict] = {}
+        # Images each page referenced, keyed by page source, with their hashes
+        self.dependencies: Dict[str, Dict[str, str]] = {}
+    
+    def process(self, path: Path, source_hash: str) -> Dict:
+        """Record for an image, encoding and caching its derivatives on a miss"""
+        if source_hash in self.records:
+            self.publish(self.records[source_hash], source_hash)
+            return self.records[source_hash]
+        
+        record_path = self.cache_dir / f"{source_hash}.json"
+        record = None
+        if self.reuse and record_path.exists():
+            with open(record_path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            if not all((self.cache_dir / source_hash / name).exists() for name in self.files(record)):
+                record = None
+        if record is None:
+            record = self.encode(path, source_hash)
+            record_path.parent.mkdir(parents=True, exist_ok=True)
+            temp = record_path.with_name(f"{record_path.name}.{os.getpid()}.tmp")
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(record, f, separators=(',', ':'))
+            os.replace(temp, record_path)
+        
+        self.publish(record, source_hash)
+        self.records[source_hash] = record
+        return record
+    
+    @staticmethod
+    def files(record: Dict) -> List[str]:
+        return [record['original']] + [variant['file'] for variant in record['variants']]
+    
+    def encode(self, path: Path, source_hash: str) -> Dict:
+        """Write the hashed original and its resized variants into the cache.
+        File names use the slugified stem, so they need no escaping in URLs."""
+        stem, suffix = slugify(path.stem, '-') or 'image', path.suffix.lower()
+        work_dir = self.cache_dir / source_hash
+        work_dir.mkdir(parents=True, exist_ok=True)
+        record = {'original': f"{stem}.{source_hash[:10]}{suffix}", 'variants': [],
+                  'width': None, 'height': None}
+        shutil.copyfile(path, work_dir / record['original'])
+        
+        if Image is None or suffix not in self.RESIZABLE:
+            if suffix != '.svg':
+                size = read_image_size(path)
+                if size:
+                    record['width'], record['height'] = size
+            return record
+        
+        with Image.open(path) as image:
+            record['width'], record['height'] = image.size
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+            widths = [width for width in IMAGE_WIDTHS if width < image.width] + [image.width]
+            for image_format in self.formats:
+                for width in widths:
+                    height = round(image.height * width / image.width)
+                    resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                    name = f"{stem}.{source_hash[:10]}.{width}w.{image_format}"
+                    resized.save(work_dir / name, image_format.upper(), quality=IMAGE_QUALITY)
+                    record['variants'].append({'format': image_format, 'width': width, 'file': name})
+        return record
+    
+    def publish(self, record: Dict, source_hash: str):
+        """Copy an image's files into the output"""
+        for name in self.files(record):
+            self.publish_file(self.cache_dir / source_hash / name, f"images/{name}")
+    
+    def rewrite(self, content_html: str, source: str, root_dir: Path) -> str:
+        """Point a page's local <img> tags at the published images.
+        
+        Each tag gets intrinsic width/height, lazy loading and async decoding;
+        when variants exist it is wrapped in a <picture> with one srcset per
+        format. Images that cannot be found are left as written. Only src is
+        replaced and missing attributes inserted; the rest of the tag is kept
+        as written.
+        """
+        page_dir = posixpath.dirname(source)
+        used = self.dependencies[source] = {}
+        
+        def replace(match):
+            tag = match.group(0)
+            attributes = {attribute.group(1).lower(): attribute
+                          for attribute in HTML_ATTRIBUTES.finditer(tag, len('<img'), len(tag) - 1)}
+            src = attributes.get('src')
+            src = html.unescape(next((value for value in src.groups()[1:] if value is not None), '')) if src else ''
+            if not src or src.startswith('data:') or not is_internal_link(src):
+                return tag
+            
+            path = unquote(src.split('#', 1)[0].split('?', 1)[0])
+            relative = posixpath.normpath(path.lstrip('/') if path.startswith('/')
+                                          else posixpath.join(page_dir, path))
+            image_path = root_dir / relative
+            if relative.startswith('..') or not image_path.is_file():
+                return tag
+            
+            source_hash = hash_file(image_path)
+            used[relative] = source_hash
+            record = self.process(image_path, source_hash)
+            
+            # Quoted as well, for records cached before names were slugified
+            start, end = attributes['src'].span()
+            src = quote(f"/images/{record['original']}")
+            img = f'{tag[:start]}src="{src}"{tag[end:]}'
+            added = {}
+            if record['width'] and 'width' not in attributes and 'height' not in attributes:
+                added['width'] = record['width']
+                added['height'] = record['height']
+            for name, value in (('loading', 'lazy'), ('decoding', 'async')):
+                if name not in attributes:
+                    added[name] = value
+            closing = '/>' if img.endswith('/>') else '>'
+            img = (img[:-len(closing)].rstrip() + ''.join(f' {name}="{value}"' for name, value in added.items())
+                   + ' ' + closing)
+            if not record['variants']:
+                return img
+            
+            sources = []
+            for image_format in dict.fromkeys(variant['format'] for variant in record['variants']):
+                srcset = ', '.join(f"{quote('/images/' + variant['file'])} {variant['width']}w"
+                                   for variant in record['variants'] if variant['format'] == image_format)
+                sources.append(f'<source type="image/{image_format}" srcset="{srcset}" sizes="{IMAGE_SIZES}" />')
+            return '<picture>' + ''.join(sources) + img + '</picture>'
+        
+        return IMG_ELEMENTS.sub(replace, content_html)
+
+
+# Placeholder for per-page values in the page shell (see generate_page_shell)
+TEMPLATE_SLOT = '\x00'
+
+# Selector prefixes of the style.css rules inlined into every page with
+# critical_css: only what lays out the first screen (theme variables, the
+# header, sidebar and content boxes and the page title). The rest arrives
+# with the full stylesheet, which every page loads anyway.
+CRITICAL_CSS_SELECTORS = ('*', ':root', '[data-theme', 'body', '.book-container',
+                          '.book-header', '.book-title', '.book-body', '.book-sidebar', '.sidebar-list',
+                          '.book-main', '.book-toc', '.book-content h1')
+
+
+class CompiledSidebar:
+    """Sidebar HTML shared by all pages, with the active item spliced in per page"""
+    
+    __slots__ = ('html', 'offsets', 'version', 'saved')
+    
+    def __init__(self, html: str, offsets: Dict[str, List[int]], version: str = '', saved: int = 0):
+        self.html = html
+        self.offsets = offsets
+        self.version = version
+        self.saved = saved  # bytes removed by minification
+    
+    def save(self, path: Path):
+        """Store the sidebar for worker processes (see _build_page_worker)"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'html': self.html, 'offsets': self.offsets, 'version': self.version,
+                       'saved': self.saved}, f, separators=(',', ':'))
+        os.replace(temp, path)
+    
+    @classmethod
+    def load(cls, path: Path) -> 'CompiledSidebar':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(**json.load(f))
+    
+    def render(self, current_path: str = "") -> str:
+        """Return the sidebar with the items linking to current_path marked active"""
+        if current_path not in self.offsets:
+            return self.html
+        return ''.join(self.iter_chunks(current_path))
+    
+    def iter_chunks(self, current_path: str = "") -> Iterator[str]:
+        """Yield the sidebar for current_path in pieces, for streaming output"""
+        start = 0
+        for offset in self.offsets.get(current_path, ()):
+            yield self.html[start:offset]
+            yield 'active'
+            start = offset
+        yield self.html[start:] if start else self.html
+
+
+class CompiledTemplate:
+    """Page shell split into static chunks around the per-page slots"""
+    
+    __slots__ = ('chunks', 'saved')
+    
+    def __init__(self, chunks: List[str], saved: int = 0):
+        self.chunks = chunks
+        self.saved = saved  # bytes removed by minification
+    
+    def render(self, title: str, content: str, sidebar: str, toc: str = "",
+               timestamp: str = "", related: str = "") -> str:
+        """Fill the slots of the shell for one page"""
+        return ''.join(self.iter_chunks(title, content, (sidebar,), toc, timestamp, related))
+    
+    def iter_chunks(self, title: str, content: str, sidebar: Iterable[str],
+                    toc: str = "", timestamp: str = "", related: str = "") -> Iterator[str]:
+        """Yield one page in pieces so it can be written without joining it"""
+        head, after_title, after_sidebar, after_content, after_related, after_timestamp, tail = self.chunks
+        yield head
+        yield title
+        yield after_title
+        yield from sidebar
+        yield after_sidebar
+        yield content
+        yield after_content
+        yield related
+        yield after_related
+        yield timestamp
+        yield after_timestamp
+        yield f'<aside class="book-toc">{toc}</aside>' if toc else ''
+        yield tail
+
+
+SUMMARY_HEADING = re.compile(r'(#+)[ \t]*(.*?)[ \t]*$')
+SUMMARY_ITEM = re.compile(r'([ \t]*)[*+-][ \t]+\[(.*?)\]\((.*?)\)')
+
+
+class NavNode:
+    """One SUMMARY.md entry: a section heading or a page link.
+    
+    ``parent`` is the enclosing page or section (None at the top level),
+    ``section`` the nearest enclosing section, and ``prev``/``next`` link
+    the pages in reading order. ``depth`` is a section's heading level.
+    """
+    
+    __slots__ = ('kind', 'title', 'path', 'depth', 'parent', 'section', 'children', 'prev', 'next')
+    
+    def __init__(self, kind: str, title: str, path: str = "", depth: int = 0,
+                 parent: Optional['NavNode'] = None, section: Optional['NavNode'] = None):
+        self.kind = kind
+        self.title = title
+        self.path = path
+        self.depth = depth
+        self.parent = parent
+        self.section = section
+        self.children: List['NavNode'] = []
+        self.prev: Optional['NavNode'] = None
+        self.next: Optional['NavNode'] = None
+    
+    @property
+    def output(self) -> str:
+        return self.path.replace('.md', '.html')
+    
+    def ancestors(self) -> List['NavNode']:
+        """Enclosing sections and pages, outermost first"""
+        chain = []
+        node = self.parent
+        while node is not None:
+            chain.append(node)
+            node = node.parent
+        return chain[::-1]
+
+
+class Navigation:
+    """SUMMARY.md parsed in one pass into a tree of NavNodes.
+    
+    ``## `` headings open top-level sections and deeper headings nest under
+    the nearest shallower one. List items (``*``, ``-`` or ``+``) nest by
+    indentation, to any depth, under the item above or else the current
+    section. ``pages`` lists the page nodes in reading order and ``nodes``
+    finds the first node of a path. Pickled as its source text, so workers
+    rebuild it instead of recursing through the prev/next chain.
+    """
+    
+    __slots__ = ('text', 'roots', 'pages', 'nodes')
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.roots: List[NavNode] = []
+        self.pages: List[NavNode] = []
+        self.nodes: Dict[str, NavNode] = {}
+        
+        sections: List[NavNode] = []  # open headings, outermost first
+        items: List[Tuple[int, NavNode]] = []  # open list items with their indentation
+        for line in text.split('\n'):
+            stripped = line.strip()
+            if stripped.startswith('#'):
+                hashes, title = SUMMARY_HEADING.match(stripped).groups()
+                if len(hashes) < 2:  # the book title
+                    continue
+                while sections and sections[-1].depth >= len(hashes):
+                    sections.pop()
+                parent = sections[-1] if sections else None
+                node = NavNode('section', title, depth=len(hashes), parent=parent, section=parent)
+                self.add(node)
+                sections.append(node)
+                items.clear()
+                continue
+            
+            match = SUMMARY_ITEM.match(line)
+            if not match:
+                continue
+            indent, title, path = match.groups()
+            indent = len(indent.expandtabs(4))
+            while items and items[-1][0] >= indent:
+                items.pop()
+            section = sections[-1] if sections else None
+            node = NavNode('page', title, path, parent=items[-1][1] if items else section, section=section)
+            self.add(node)
+            items.append((indent, node))
+            
+            if self.pages:
+                node.prev = self.pages[-1]
+                self.pages[-1].next = node
+            self.pages.append(node)
+            self.nodes.setdefault(path, node)
+    
+    def add(self, node: NavNode):
+        (node.parent.children if node.parent else self.roots).append(node)
+    
+    def __reduce__(self):
+        return (Navigation, (self.text,))
+    
+    def find(self, path: str) -> Optional[NavNode]:
+        """The first page node linking to a path"""
+        return self.nodes.get(path)
+
 
 class BookGen:
     """Custom static site generator mirroring GitBook features"""
     
-    def __init__(self, root_dir: str = "."):
+    def __init__(self, root_dir: str = ".", use_cache: bool = True,
+                 cache_max_bytes: int = RENDER_CACHE_MAX_BYTES, precompress: bool = False,
+                 fragments: bool = False, output_dir: Optional[str] = None,
+                 paginate_bytes: int = PAGINATE_MAX_BYTES, minify: bool = False,
+                 output_backend: str = 'dir', archive_path: Optional[str] = None,
+                 offline: bool = False, record_salt: Optional[str] = None, critical_css: bool = False):
         self.root_dir = Path(root_dir)
-        self.output_dir = self.root_dir / "_book"
+        # Builds write into a staging directory (output_dir) that replaces
+        # the published tree once complete
+        self.publish_dir = self.root_dir / "_book"
+        self.output_dir = Path(output_dir) if output_dir else self.publish_dir
+        self.staging_dir = self.root_dir / ".bookgen-staging"
+        self.cache_dir = self.root_dir / ".bookgen-cache"
+        self.manifest_path = self.cache_dir / "manifest.json"
         self.config = self.load_config()
         
-        # Markdown extensions similar to GitBook
-        self.md = markdown.Markdown(extensions=[
-            'fenced_code',
-            'tables',
-            'toc',
-            'codehilite',
-            'nl2br',
-            'sane_lists',
-            'meta',
-            'attr_list',
-            'def_list',
-            'footnotes',
-            'admonition'
-        ])
+        self.md = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS,
+                                    extension_configs=MARKDOWN_EXTENSION_CONFIGS)
+        self._templates: Dict[str, CompiledTemplate] = {}
+        self.profiler = BuildProfiler()
+        self.render_cache = RenderCache(self.cache_dir / "render", cache_max_bytes) if use_cache else None
+        self.highlight_cache = HighlightCache(self.cache_dir / "highlight", cache_max_bytes) if use_cache else None
+        # Page records (see analyze_page) are only read back under the same
+        # salt; without the cache it is unique to this generator (and its
+        # workers), so only records written since it started are reused
+        self.record_salt = record_salt or hash_bytes(json.dumps({
+            'version': PAGE_RECORD_VERSION,
+            'render': RenderCache.compute_salt(),
+            'run': None if use_cache else os.urandom(8).hex(),
+        }, sort_keys=True).encode('utf-8'))
+        HighlightCache.active = self.highlight_cache
+        install_highlight_cache()
+        self.precompress = precompress
+        self.fragments = fragments
+        self.paginate_bytes = paginate_bytes
+        self.minify = minify
+        self.critical_css = critical_css
+        if output_backend not in OUTPUT_BACKENDS:
+            raise ValueError(f"Unknown output backend: {output_backend}")
+        self.output_backend = output_backend
+        self.archive_path = Path(archive_path) if archive_path else None
+        if output_backend == 'tar' and self.packed_path().suffix == '.zst' and not zstandard:
+            raise ValueError(f"zstandard is not installed, so {self.packed_path()} cannot be written "
+                             "(install zstandard or use an --archive path ending in .tar.gz)")
+        # PackedOutput (PendingOutput in workers) while a packed build runs
+        self.packer = None
+        self.offline = offline
+        # Page HTML bytes before and after minification, for pages written
+        # by this process since the last build started (see build)
+        self.minified = [0, 0]
+        self._assets: Optional[Dict[str, Tuple[str, str]]] = None
+        self.timestamps: Dict[str, int] = {}
+        self._navigation: Optional[Tuple[str, Navigation]] = None
+        self.navigation: Optional[Navigation] = None
+        self.images = ImagePipeline(self.cache_dir / "images", partial(self.copy_output, immutable=True),
+                                    reuse=use_cache)
+    
+    def worker_options(self) -> Dict:
+        """Constructor options a worker process needs to mirror this generator"""
+        return {
+            'use_cache': self.render_cache is not None,
+            'cache_max_bytes': self.render_cache.max_bytes if self.render_cache else RENDER_CACHE_MAX_BYTES,
+            'precompress': self.precompress,
+            'fragments': self.fragments,
+            'output_dir': str(self.output_dir),
+            'paginate_bytes': self.paginate_bytes,
+            'minify': self.minify,
+            'critical_css': self.critical_css,
+            'offline': self.offline,
+            'record_salt': self.record_salt,
+        }
+    
+    def enable_profiling(self, enabled: bool = True):
+        """Start a fresh profiler for the next build; a disabled one also
+        removes the instrumentation a profiled build left behind"""
+        BuildProfiler.uninstrument(self.md)
+        self.profiler = BuildProfiler(enabled=enabled)
+        if enabled:
+            self.profiler.instrument(self.md)
+    
+    def write_file(self, path: Path, data: str):
+        """Write a text file under the output directory"""
+        self.write_chunks(path, (data,))
+    
+    def write_chunks(self, path: Path, chunks: Iterable[str]) -> int:
+        """Stream text pieces into a file under the output directory,
+        returning the number of bytes in it.
+        
+        With precompression on, the .gz (and, if brotli is installed, .br)
+        siblings are compressed from the same stream as it is written. Each
+        file is written to a temporary name first and only replaces the
+        existing one if its bytes differ (see commit_output). In a packed
+        build the bytes are buffered in memory and go to the packer instead.
+        """
+        buffers = {}
+        
+        def target(temp: Path, stack: ExitStack):
+            if self.packer is None:
+                return stack.enter_context(open(temp, 'wb'))
+            return buffers.setdefault(temp, io.BytesIO())
+        
+        if self.packer is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        written = [(temp, path)]
+        size = 0
+        with ExitStack() as stack:
+            f = target(temp, stack)
+            gz = br = compressor = None
+            if self.precompress:
+                # No file name or mtime in the header keeps the output reproducible
+                written.append((Path(f"{temp}.gz"), Path(f"{path}.gz")))
+                gz_file = target(written[-1][0], stack)
+                gz = stack.enter_context(gzip.GzipFile(filename='', mode='wb', fileobj=gz_file,
+                                                       compresslevel=GZIP_LEVEL, mtime=0))
+                if brotli:
+                    written.append((Path(f"{temp}.br"), Path(f"{path}.br")))
+                    br = target(written[-1][0], stack)
+                    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            
+            for chunk in chunks:
+                encoded = chunk.encode('utf-8')
+                f.write(encoded)
+                size += len(encoded)
+                if gz:
+                    gz.write(encoded)
+                if compressor:
+                    br.write(compressor.process(encoded))
+            if compressor:
+                br.write(compressor.finish())
+        for temp, final in written:
+            if self.packer is None:
+                self.commit_output(temp, final)
+            else:
+                self.packer.add(self.output_relative(final), buffers[temp].getvalue())
+        self.profiler.count_bytes(size)
+        return size
+    
+    def output_relative(self, path: Path) -> str:
+        """Path of an output file relative to the output root, as packed"""
+        return path.relative_to(self.output_dir).as_posix()
+    
+    def output_exists(self, relative: str) -> bool:
+        """Whether the build's output holds a file (packed or on disk)"""
+        if self.packer is not None:
+            return self.packer.exists(relative)
+        return (self.output_dir / relative).exists()
+    
+    def commit_output(self, temp: Path, path: Path):
+        """Move a freshly written file into place unless its bytes are unchanged.
+        
+        Unchanged files keep their inode and mtime, so rsync and object-store
+        syncs skip them. The comparison is against the published tree; when
+        building into the staging directory, the published copy is linked in.
+        """
+        reference = self.publish_dir / path.relative_to(self.output_dir)
+        if not reference.exists():
+            reference = path
+        if reference.exists() and same_contents(temp, reference):
+            temp.unlink()
+            if reference != path and not (path.exists() and os.path.samefile(reference, path)):
+                if path.exists():
+                    path.unlink()
+                link_or_copy(reference, path)
+        else:
+            os.replace(temp, path)
+    
+    def copy_output(self, source: Path, relative: str, immutable: bool = False):
+        """Copy a file into the output directory, keeping an identical published copy.
+        
+        With ``immutable`` (content-hashed names) an existing file is left as is.
+        """
+        if immutable and self.output_exists(relative):
+            return
+        if self.packer is not None:
+            self.packer.add(relative, source.read_bytes())
+            return
+        path = self.output_dir / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        shutil.copyfile(source, temp)
+        self.commit_output(temp, path)
+    
+    @contextmanager
+    def staged_output(self, seed: bool):
+        """Direct a build into the staging directory and publish it atomically.
+        
+        With ``seed`` set (incremental builds), staging starts as hard links to
+        the published tree so untouched pages carry over. On success the
+        staged tree is swapped in; on failure the published tree is left as
+        it was.
+        """
+        if self.staging_dir.exists():
+            shutil.rmtree(self.staging_dir)
+        if seed and self.publish_dir.exists():
+            shutil.copytree(self.publish_dir, self.staging_dir, copy_function=link_or_copy)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        self.output_dir = self.staging_dir
+        try:
+            yield
+            swap_directories(self.staging_dir, self.publish_dir)
+        finally:
+            self.output_dir = self.publish_dir
+            if self.staging_dir.exists():
+                shutil.rmtree(self.staging_dir)
+    
+    @contextmanager
+    def packed_output(self, seed: bool):
+        """Direct a build straight into the output backend (see PackedOutput).
+        
+        With ``seed`` set (incremental builds), files of the previous packed
+        build that are not written again are carried over. Nothing is
+        written under ``output_dir``, which only names the root output paths
+        are relative to. The archive replaces the previous one in
+        pack_output; on failure the previous one is left as it was.
+        """
+        path = self.packed_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        backend = {'tar': TarOutput, 'zip': ZipOutput, 'store': ContentStore}[self.output_backend]
+        previous = self.load_packed_index() if seed else {}
+        self.packer = PackedOutput(backend(path, max(self.timestamps.values(), default=0)), previous)
+        self.output_dir = self.staging_dir
+        try:
+            yield
+        finally:
+            self.output_dir = self.publish_dir
+            self.packer = None
+            for leftover in path.parent.glob(f"{path.name}.*.tmp"):
+                leftover.unlink()
+    
+    def diff_outputs(self) -> Dict[str, List[str]]:
+        """Files the staged tree adds, changes and removes relative to the published one"""
+        published = list_files(self.publish_dir) if self.publish_dir.exists() else set()
+        staged = list_files(self.output_dir)
+        return {
+            'added': sorted(staged - published),
+            'changed': sorted(path for path in staged & published
+                              if not same_contents(self.output_dir / path, self.publish_dir / path)),
+            'removed': sorted(published - staged),
+        }
+    
+    def packed_path(self) -> Path:
+        """Archive or store a packed build goes to (default: next to _book)"""
+        if self.archive_path:
+            return self.archive_path
+        suffix = {'tar': '.tar.zst' if zstandard else '.tar.gz', 'zip': '.zip', 'store': '.store'}
+        return self.publish_dir.with_name(self.publish_dir.name + suffix[self.output_backend])
+    
+    def pack_files(self, files: Optional[List[Tuple[str, bytes]]]):
+        """Pack the files a worker process wrote (see PendingOutput)"""
+        for relative, data in files or ():
+            self.packer.add(relative, data)
+    
+    def load_packed_index(self) -> Dict[str, str]:
+        """Digest of every file in the previous packed build, if it went to
+        the current packed_path() and is still there"""
+        try:
+            with open(self.cache_dir / "packed.json", 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if state.get('path') != str(self.packed_path()) or not self.packed_path().exists():
+            return {}
+        return state['files']
+    
+    def pack_output(self) -> Dict[str, List[str]]:
+        """Finish the packed build, returning what changed since the
+        previous one.
+        
+        Files went into the tar or zip archive or the ContentStore as they
+        were written; identical files are detected by hash and shared where
+        the backend allows. Entries carry the newest page timestamp, so the
+        same build of unchanged inputs gives a byte-identical archive.
+        """
+        path = self.packed_path()
+        previous = self.packer.previous
+        index = self.packer.close()
+        
+        index_path = self.cache_dir / "packed.json"
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(index_path, 'w', encoding='utf-8') as f:
+            json.dump({'path': str(path), 'files': index}, f, indent=2, sort_keys=True)
+        print(f"📦 Packed {len(index)} files ({len(set(index.values()))} distinct) into {path}")
+        return {
+            'added': sorted(set(index) - set(previous)),
+            'changed': sorted(relative for relative in set(index) & set(previous)
+                              if index[relative] != previous[relative]),
+            'removed': sorted(set(previous) - set(index)),
+        }
+    
+    def write_deploy_manifest(self, delta: Dict[str, List[str]], path: Optional[Path] = None):
+        """Save the changed-files manifest for deploys and summarize it"""
+        path = Path(path or self.cache_dir / "deploy.json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(delta, f, indent=2)
+        print(f"📦 Deploy delta: {len(delta['added'])} added, {len(delta['changed'])} changed, "
+              f"{len(delta['removed'])} removed ({path})")
+    
+    def remove_output(self, path: Path):
+        """Delete an output file together with its precompressed siblings"""
+        for candidate in (path, Path(f"{path}.gz"), Path(f"{path}.br")):
+            if self.packer is not None:
+                self.packer.remove(self.output_relative(candidate))
+            elif candidate.exists():
+                candidate.unlink()
+    
+    def clear_output(self, relative: str):
+        """Delete a directory of the output before it is written again"""
+        if self.packer is not None:
+            for path in [path for path in self.packer.files() if path.startswith(relative + '/')]:
+                self.packer.remove(path)
+        elif (self.output_dir / relative).exists():
+            shutil.rmtree(self.output_dir / relative)
     
     def load_config(self) -> Dict:
         """Load book.json configuration"""
@@ -43,102 +2225,208 @@ class BookGen:
                 return json.load(f)
         return {}
     
-    def parse_summary(self) -> List[Dict]:
+    def reload_config(self):
+        """Re-read book.json and drop everything generated from the old config"""
+        self.config = self.load_config()
+        self._templates.clear()
+        self._assets = None
+    
+    def load_manifest(self) -> Dict:
+        """Load the build manifest written by the previous build"""
+        if self.manifest_path.exists():
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                print("⚠️  Warning: build manifest is unreadable, ignoring it...")
+        return {}
+    
+    def save_manifest(self, manifest: Dict):
+        """Persist the build manifest for the next incremental build"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+    
+    def compute_fingerprint(self) -> Dict[str, str]:
+        """Hash the inputs shared by every page.
+        
+        If any of these change, every page has to be rebuilt: book.json feeds
+        the page shell, SUMMARY.md feeds every sidebar, the generator itself
+        defines the templates and the generated assets, and the output
+        options decide which files each page produces.
+        """
+        assets = ''.join(content for _, content in self.build_assets().values())
+        return {
+            'config': hash_file(self.root_dir / "book.json"),
+            'summary': hash_file(self.root_dir / "SUMMARY.md"),
+            'templates': hash_bytes(Path(__file__).read_bytes() + assets.encode('utf-8')),
+            'options': json.dumps({'precompress': self.precompress, 'fragments': self.fragments,
+                                   'paginate_bytes': self.paginate_bytes, 'minify': self.minify,
+                                   'critical_css': self.critical_css,
+                                   'output_backend': self.output_backend, 'offline': self.offline},
+                                  sort_keys=True),
+        }
+    
+    def load_navigation(self) -> Navigation:
+        """Parsed SUMMARY.md, reused until the file changes"""
+        summary_hash = hash_file(self.root_dir / "SUMMARY.md")
+        if self._navigation is None or self._navigation[0] != summary_hash:
+            self._navigation = (summary_hash, self.parse_summary())
+        self.navigation = self._navigation[1]
+        return self.navigation
+    
+    def parse_summary(self) -> Navigation:
         """Parse SUMMARY.md to extract navigation structure"""
         summary_path = self.root_dir / "SUMMARY.md"
         if not summary_path.exists():
             raise FileNotFoundError("SUMMARY.md not found")
         
         with open(summary_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        navigation = []
-        current_section = None
-        
-        # Parse markdown links [Title](path)
-        lines = content.split('\n')
-        for line in lines:
-            line = line.strip()
-            
-            # Section headers (## or ### or ----)
-            if line.startswith('#') or line == '---':
-                if line.startswith('##'):
-                    section_title = line.lstrip('#').strip()
-                    current_section = {
-                        'title': section_title,
-                        'type': 'section',
-                        'items': []
-                    }
-                    navigation.append(current_section)
-                continue
-            
-            # Parse links [Title](path)
-            match = re.match(r'\s*\*\s*\[(.*?)\]\((.*?)\)', line)
-            if match:
-                title, path = match.groups()
-                item = {
-                    'title': title,
-                    'path': path,
-                    'type': 'page'
-                }
-                
-                if current_section:
-                    current_section['items'].append(item)
-                else:
-                    navigation.append(item)
-        
-        return navigation
+            return Navigation(f.read())
     
     def render_markdown(self, file_path: Path) -> Tuple[str, Dict]:
         """Render markdown file to HTML with metadata"""
         if not file_path.exists():
             return f"<p>File not found: {file_path}</p>", {}
         
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        source = file_path.read_bytes()
+        if self.render_cache:
+            key = self.render_cache.key(source)
+            cached = self.render_cache.get(key)
+            if cached is not None:
+                return cached
         
         # Reset markdown instance for new file
         self.md.reset()
-        html_content = self.md.convert(content)
+        html_content = self.md.convert(source.decode('utf-8'))
         metadata = self.md.Meta if hasattr(self.md, 'Meta') else {}
         
+        if self.render_cache:
+            self.render_cache.put(key, html_content, metadata)
+        
         return html_content, metadata
     
-    def generate_sidebar(self, navigation: List[Dict], current_path: str = "") -> str:
-        """Generate sidebar navigation HTML"""
-        html = '<nav class="book-sidebar">\n'
-        html += '<div class="book-sidebar-content">\n'
-        
-        for item in navigation:
-            if item['type'] == 'section':
-                html += f'<div class="sidebar-section">\n'
-                html += f'<h3 class="sidebar-section-title">{item["title"]}</h3>\n'
-                html += '<ul class="sidebar-list">\n'
-                
-                for subitem in item['items']:
-                    active = 'active' if subitem['path'] == current_path else ''
-                    html += f'<li class="sidebar-item {active}">\n'
-                    html += f'  <a href="/{subitem["path"].replace(".md", ".html")}">{subitem["title"]}</a>\n'
-                    html += '</li>\n'
-                
-                html += '</ul>\n'
-                html += '</div>\n'
+    def compile_sidebar(self, navigation: Navigation,
+                        parts: Optional[Dict[str, List[str]]] = None) -> 'CompiledSidebar':
+        """Render the sidebar once for every page of the build.
+        
+        The markup is produced with every item inactive; the offsets where
+        each path's ``active`` class goes are recorded so that
+        CompiledSidebar.render() only has to splice them in. The slots are
+        marked with TEMPLATE_SLOT while the markup is minified. ``parts``
+        maps the sources of paginated pages to the labels of their later
+        parts, as recorded by analyze_page.
+        """
+        parts = parts or {}
+        chunks = ['<nav class="book-sidebar">\n', '<div class="book-sidebar-content">\n']
+        slots = []  # paths, in the order of their TEMPLATE_SLOT markers
+        
+        def add_item(tag: str, item: NavNode):
+            output = item.output
+            chunks.append(f'<{tag} class="sidebar-item ')
+            slots.append(item.path)
+            chunks.append(f'{TEMPLATE_SLOT}">\n')
+            chunks.append(f'  <a href="/{output}">{item.title}</a>\n')
             
-            elif item['type'] == 'page':
-                active = 'active' if item['path'] == current_path else ''
-                html += f'<div class="sidebar-item {active}">\n'
-                html += f'  <a href="/{item["path"].replace(".md", ".html")}">{item["title"]}</a>\n'
-                html += '</div>\n'
+            # Oversized pages list their later parts, keyed by part output
+            labels = parts.get(item.path)
+            if labels:
+                chunks.append('  <ul class="sidebar-parts">\n')
+                for number, label in enumerate(labels, 2):
+                    part_output = self.part_output(output, number)
+                    chunks.append('    <li class="sidebar-item sidebar-part ')
+                    slots.append(part_output)
+                    chunks.append(f'{TEMPLATE_SLOT}"><a href="/{part_output}">{label}</a></li>\n')
+                chunks.append('  </ul>\n')
+            add_children(item.children, '<ul class="sidebar-list sidebar-nested">\n')
+            chunks.append(f'</{tag}>\n')
         
-        html += '</div>\n'
-        html += '</nav>\n'
+        def add_section(section: NavNode):
+            chunks.append('<div class="sidebar-section">\n')
+            chunks.append(f'<h{min(section.depth + 1, 6)} class="sidebar-section-title">{section.title}</h{min(section.depth + 1, 6)}>\n')
+            add_children(section.children, '<ul class="sidebar-list">\n')
+            chunks.append('</div>\n')
         
-        return html
+        def add_children(children: List[NavNode], opening: str):
+            # Runs of pages share a list; nested sections sit between them
+            in_list = False
+            for child in children:
+                if child.kind == 'section':
+                    if in_list:
+                        chunks.append('</ul>\n')
+                        in_list = False
+                    add_section(child)
+                else:
+                    if not in_list:
+                        chunks.append(opening)
+                        in_list = True
+                    add_item('li', child)
+            if in_list:
+                chunks.append('</ul>\n')
+        
+        for item in navigation.roots:
+            if item.kind == 'section':
+                add_section(item)
+            else:
+                add_item('div', item)
+        
+        chunks.append('</div>\n')
+        chunks.append('</nav>\n')
+        
+        # With fragments, pages carry the sidebar version so the client can
+        # tell when the shared sidebar asset (sidebar.<version>.html) changed
+        version = hash_bytes(''.join(chunks).encode('utf-8'))[:10]
+        if self.fragments:
+            chunks[0] = f'<nav class="book-sidebar" data-version="{version}">\n'
+        
+        html = ''.join(chunks)
+        saved = 0
+        if self.minify:
+            minified = minify_html(html)
+            saved, html = len(html) - len(minified), minified
+        
+        # Translate the slot markers into character offsets in the final HTML
+        pieces = html.split(TEMPLATE_SLOT)
+        offsets = {}
+        position = 0
+        for path, piece in zip(slots, pieces):
+            position += len(piece)
+            offsets.setdefault(path, []).append(position)
+        
+        return CompiledSidebar(''.join(pieces), offsets, version, saved)
+    
+    def generate_sidebar(self, navigation: Navigation, current_path: str = "",
+                         parts: Optional[Dict[str, List[str]]] = None) -> str:
+        """Generate sidebar navigation HTML"""
+        return self.compile_sidebar(navigation, parts).render(current_path)
+    
+    def compile_html_template(self, config: Dict) -> 'CompiledTemplate':
+        """Interpolate the page shell for a config once, leaving page slots open"""
+        key = json.dumps(config, sort_keys=True)
+        if key not in self._templates:
+            shell = self.generate_page_shell(config, critical=self.critical_css)
+            saved = 0
+            if self.minify or self.critical_css:
+                # Measured against the plain shell, so the inlined critical
+                # CSS counts against the savings
+                plain = self.generate_page_shell(config)
+                if self.minify:
+                    shell = minify_html(shell)
+                saved = len(plain) - len(shell)
+            self._templates[key] = CompiledTemplate(shell.split(TEMPLATE_SLOT), saved)
+        return self._templates[key]
     
     def generate_html_template(self, title: str, content: str, sidebar: str, 
-                              config: Dict, toc: str = "") -> str:
+                              config: Dict, toc: str = "", timestamp: str = "", related: str = "") -> str:
         """Generate complete HTML page"""
+        return self.compile_html_template(config).render(title, content, sidebar, toc, timestamp, related)
+    
+    def generate_page_shell(self, config: Dict, critical: bool = False) -> str:
+        """Generate the HTML page shell with TEMPLATE_SLOT marking each
+        per-page value (title, sidebar, content, related pages, timestamp and toc).
+        ``critical`` inlines the critical CSS (see stylesheet_links)."""
         site_title = config.get('title', 'Documentation')
+        slot = TEMPLATE_SLOT
         
         html = f'''<!DOCTYPE html>
 <html lang="en">
@@ -147,11 +2435,10 @@ class BookGen:
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <meta name="description" content="{config.get('description', '')}">
     <meta name="author" content="{config.get('author', '')}">
-    <title>{title} - {site_title}</title>
-    <link rel="stylesheet" href="/assets/style.css">
-    <link rel="stylesheet" href="/assets/highlight.css">
+    <title>{slot} - {site_title}</title>
+    {self.stylesheet_links(critical)}
 </head>
-<body>
+<body{' data-fragments="/fragments/"' if self.fragments else ''}{' data-service-worker="/sw.js"' if self.offline else ''}>
     <div class="book-container">
         <div class="book-header">
             <div class="book-header-content">
@@ -166,31 +2453,51 @@ class BookGen:
         </div>
         
         <div class="book-body">
-            {sidebar}
+            {slot}
             
             <main class="book-main">
                 <div class="book-content">
-                    {content}
+                    {slot}
+                    {slot}
                 </div>
                 
                 <footer class="book-footer">
                     <div class="book-footer-content">
                         <p>Built with BookGen - A modern GitBook alternative</p>
-                        <p>Generated on {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</p>
+                        <p>Last updated {slot}</p>
                     </div>
                 </footer>
             </main>
             
-            {f'<aside class="book-toc">{toc}</aside>' if toc else ''}
+            {slot}
         </div>
     </div>
     
-    <script src="/assets/script.js"></script>
+    <script src="{self.asset_url('script.js')}"></script>
 </body>
 </html>'''
         
         return html
     
+    def stylesheet_links(self, critical: bool = False) -> str:
+        """Stylesheet tags for the page head.
+        
+        With ``critical`` set (see critical_css), the critical rules
+        (CRITICAL_CSS_SELECTORS) are inlined and the full stylesheets are
+        preloaded and applied once they arrive, so first paint does not wait
+        for them.
+        """
+        urls = [self.asset_url('style.css'), self.asset_url('highlight.css')]
+        if not critical:
+            return '\n    '.join(f'<link rel="stylesheet" href="{url}">' for url in urls)
+        critical = critical_css_rules(self.build_assets()['style.css'][1], CRITICAL_CSS_SELECTORS)
+        tags = [f'<style>{critical}</style>']
+        tags.extend(f'<link rel="preload" href="{url}" as="style" '
+                    f'onload="this.onload=null;this.rel=\'stylesheet\'">' for url in urls)
+        tags.append('<noscript>' + ''.join(f'<link rel="stylesheet" href="{url}">' for url in urls)
+                    + '</noscript>')
+        return '\n    '.join(tags)
+    
     def generate_css(self) -> str:
         """Generate modern CSS styling"""
         return '''/* BookGen - Modern GitBook Alternative Styles */
@@ -276,6 +2583,7 @@ body {
     display: flex;
     gap: 15px;
     align-items: center;
+    position: relative;
 }
 
 .search-input {
@@ -294,6 +2602,44 @@ body {
     border-color: var(--secondary-color);
 }
 
+.search-results {
+    display: none;
+    position: absolute;
+    top: 100%;
+    left: 0;
+    width: 350px;
+    max-height: 60vh;
+    overflow-y: auto;
+    margin-top: 6px;
+    background: var(--background);
+    border: 1px solid var(--border-color);
+    border-radius: 4px;
+    box-shadow: var(--shadow);
+    z-index: 200;
+}
+
+.search-results.open {
+    display: block;
+}
+
+.search-results a,
+.search-empty {
+    display: block;
+    padding: 8px 15px;
+    color: var(--text-color);
+    text-decoration: none;
+    font-size: 14px;
+}
+
+.search-results a:hover {
+    background: var(--sidebar-bg);
+    color: var(--link-color);
+}
+
+.search-empty {
+    color: var(--text-muted);
+}
+
 .theme-toggle {
     background: none;
     border: 1px solid var(--border-color);
@@ -361,12 +2707,137 @@ body {
     color: var(--link-color);
 }
 
-.sidebar-item.active a {
+.sidebar-item.active > a {
     background: var(--secondary-color);
     color: white;
     font-weight: 500;
 }
 
+.sidebar-parts {
+    list-style: none;
+    margin: 4px 0 0 12px;
+    font-size: 0.9em;
+}
+
+.sidebar-nested {
+    margin: 4px 0 0 12px;
+}
+
+.book-toc {
+    width: 240px;
+    flex-shrink: 0;
+    padding: 40px 20px;
+    position: sticky;
+    top: 60px;
+    align-self: flex-start;
+    max-height: calc(100vh - 60px);
+    overflow-y: auto;
+    font-size: 0.9rem;
+}
+
+.page-parts h4 {
+    margin-bottom: 10px;
+    color: var(--text-muted);
+}
+
+.page-parts ol, .page-parts ul {
+    list-style: none;
+}
+
+.page-parts ul {
+    margin: 4px 0 8px 12px;
+}
+
+.page-parts a {
+    display: block;
+    padding: 3px 0;
+    color: var(--text-color);
+    text-decoration: none;
+}
+
+.page-parts li.active > a {
+    color: var(--link-color);
+    font-weight: 600;
+}
+
+.page-parts-nav {
+    display: flex;
+    justify-content: space-between;
+    gap: 20px;
+    margin-top: 40px;
+    padding-top: 20px;
+    border-top: 1px solid var(--border-color);
+}
+
+.page-parts-next {
+    margin-left: auto;
+}
+
+.book-related {
+    margin-top: 40px;
+    padding: 20px;
+    background: var(--sidebar-bg);
+    border-radius: 6px;
+}
+
+.book-related h4 {
+    margin-bottom: 10px;
+    font-size: 0.875rem;
+    text-transform: uppercase;
+    letter-spacing: 0.05em;
+    color: var(--text-muted);
+}
+
+.book-related ul {
+    margin-bottom: 0;
+}
+
+.book-breadcrumbs {
+    margin-bottom: 20px;
+    font-size: 0.875rem;
+    color: var(--text-muted);
+}
+
+.book-pager {
+    display: flex;
+    justify-content: space-between;
+    gap: 20px;
+    margin-top: 40px;
+    padding-top: 20px;
+    border-top: 1px solid var(--border-color);
+}
+
+.book-pager-next {
+    margin-left: auto;
+    text-align: right;
+}
+
+.collection-list, .collection-tags {
+    list-style: none;
+    padding-left: 0;
+}
+
+.collection-list li {
+    padding: 12px 0;
+    border-bottom: 1px solid var(--border-color);
+}
+
+.collection-list p {
+    margin: 4px 0 0;
+    color: var(--text-muted);
+}
+
+.collection-updated, .collection-count {
+    margin-left: 10px;
+    font-size: 0.8rem;
+    color: var(--text-muted);
+}
+
+.collection-tags li {
+    display: inline-block;
+    margin: 0 12px 8px 0;
+}
+
 .book-main {
     flex: 1;
     margin-left: 280px;
@@ -454,6 +2925,11 @@ body {
     font-style: italic;
 }
 
+.book-content img {
+    max-width: 100%;
+    height: auto;
+}
+
 .book-content table {
     width: 100%;
     border-collapse: collapse;
@@ -488,6 +2964,12 @@ body {
 }
 
 /* Responsive Design */
+@media (max-width: 1100px) {
+    .book-toc {
+        display: none;
+    }
+}
+
 @media (max-width: 768px) {
     .book-sidebar {
         transform: translateX(-100%);
@@ -516,83 +2998,306 @@ body {
     .book-footer {
         display: none;
     }
-    
-    .book-main {
-        margin-left: 0;
+    
+    .book-main {
+        margin-left: 0;
+    }
+}
+'''
+    
+    def generate_js(self) -> str:
+        """Generate JavaScript for interactivity"""
+        return '''// BookGen - Interactive Features
+
+// Theme Toggle
+const themeToggle = document.getElementById('theme-toggle');
+const root = document.documentElement;
+
+// Load saved theme or detect preference
+const savedTheme = localStorage.getItem('theme') || 
+    (window.matchMedia('(prefers-color-scheme: dark)').matches ? 'dark' : 'light');
+root.setAttribute('data-theme', savedTheme);
+
+themeToggle.addEventListener('click', () => {
+    const currentTheme = root.getAttribute('data-theme');
+    const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
+    root.setAttribute('data-theme', newTheme);
+    localStorage.setItem('theme', newTheme);
+});
+
+// Site-wide Search
+// Queries the inverted index written to /search/ at build time. The page
+// catalogue is fetched on first use, and each shard (the terms sharing a
+// two-character prefix) only when a query needs it.
+const searchInput = document.getElementById('search-input');
+const searchResults = document.createElement('div');
+searchResults.className = 'search-results';
+searchInput.parentNode.insertBefore(searchResults, searchInput.nextSibling);
+
+let searchMeta = null;
+const searchShards = {};
+
+function loadSearchMeta() {
+    if (!searchMeta) {
+        searchMeta = fetch('/search/meta.json').then(response => response.json());
+    }
+    return searchMeta;
+}
+
+function loadSearchShard(meta, key) {
+    const file = meta.shards[key];
+    if (!file) return Promise.resolve({});
+    if (!searchShards[key]) {
+        searchShards[key] = fetch('/search/' + file).then(response => response.json());
+    }
+    return searchShards[key];
+}
+
+function tokenize(text) {
+    return text.toLowerCase().match(/[\\p{L}\\p{N}_]+/gu) || [];
+}
+
+// Pages matching every query term (the last one as a prefix), best first
+async function searchPages(query) {
+    const terms = tokenize(query).filter(term => term.length >= 2);
+    if (!terms.length) return [];
+    
+    const meta = await loadSearchMeta();
+    const shards = await Promise.all(terms.map(term => loadSearchShard(meta, term.slice(0, 2))));
+    
+    // Per term: doc -> score and doc -> body positions
+    const matches = terms.map((term, i) => {
+        const scores = new Map();
+        const positions = new Map();
+        const prefix = i === terms.length - 1;
+        for (const [indexed, postings] of Object.entries(shards[i])) {
+            if (indexed !== term && !(prefix && indexed.startsWith(term))) continue;
+            for (const [doc, fields, ...deltas] of postings) {
+                const score = (fields & 1 ? 10 : 0) + (fields & 2 ? 5 : 0) + deltas.length;
+                scores.set(doc, (scores.get(doc) || 0) + score);
+                const docPositions = positions.get(doc) || new Set();
+                let position = 0;
+                deltas.forEach(delta => docPositions.add(position += delta));
+                positions.set(doc, docPositions);
+            }
+        }
+        return { scores, positions };
+    });
+    
+    const results = [];
+    for (const [doc, score] of matches[0].scores) {
+        if (!matches.every(match => match.scores.has(doc))) continue;
+        let total = score;
+        for (let i = 1; i < matches.length; i++) {
+            total += matches[i].scores.get(doc);
+            // Bonus when the terms appear next to each other as a phrase
+            const next = matches[i].positions.get(doc);
+            for (const position of matches[i - 1].positions.get(doc) || []) {
+                if (next && next.has(position + 1)) {
+                    total += 20;
+                    break;
+                }
+            }
+        }
+        results.push([total, doc]);
+    }
+    
+    return results
+        .sort((a, b) => b[0] - a[0])
+        .slice(0, 10)
+        .map(([, doc]) => meta.docs[doc]);
+}
+
+let searchRequest = 0;
+
+searchInput.addEventListener('input', async (e) => {
+    const query = e.target.value;
+    const request = ++searchRequest;
+    
+    if (query.trim().length < 2) {
+        searchResults.classList.remove('open');
+        return;
+    }
+    
+    const results = await searchPages(query).catch(() => []);
+    if (request !== searchRequest) return;
+    
+    searchResults.innerHTML = '';
+    results.forEach(([url, title]) => {
+        const link = document.createElement('a');
+        link.href = url;
+        link.textContent = title;
+        searchResults.appendChild(link);
+    });
+    if (!results.length) {
+        searchResults.innerHTML = '<div class="search-empty">No results</div>';
+    }
+    searchResults.classList.add('open');
+});
+
+searchInput.addEventListener('keydown', (e) => {
+    if (e.key === 'Enter') {
+        const first = searchResults.querySelector('a');
+        if (first) window.location.href = first.href;
+    } else if (e.key === 'Escape') {
+        searchResults.classList.remove('open');
+    }
+});
+
+document.addEventListener('click', (e) => {
+    if (e.target !== searchInput && !searchResults.contains(e.target)) {
+        searchResults.classList.remove('open');
     }
+});
+
+// Paginated pages: an anchor that lives in another part of the page is
+// followed to that part; the parts table of contents lists every id of
+// each part in data-anchors
+function partLinkFor(hash) {
+    if (!hash) return null;
+    const id = decodeURIComponent(hash.slice(1));
+    if (document.getElementById(id)) return null;
+    const link = [...document.querySelectorAll('.page-parts a[data-anchors]')]
+        .find(link => link.dataset.anchors.split(' ').includes(id));
+    return link ? link.pathname + hash : null;
 }
-'''
-    
-    def generate_js(self) -> str:
-        """Generate JavaScript for interactivity"""
-        return '''// BookGen - Interactive Features
 
-// Theme Toggle
-const themeToggle = document.getElementById('theme-toggle');
-const root = document.documentElement;
+const initialPartLink = partLinkFor(location.hash);
+if (initialPartLink) window.location.replace(initialPartLink);
 
-// Load saved theme or detect preference
-const savedTheme = localStorage.getItem('theme') || 
-    (window.matchMedia('(prefers-color-scheme: dark)').matches ? 'dark' : 'light');
-root.setAttribute('data-theme', savedTheme);
+// Instant Navigation
+// Books built with --fragments have a JSON fragment per page under
+// /fragments/. Internal links then swap only the content area, and pages are
+// prefetched on hover and next to the current page. Full pages are still
+// written for crawlers, direct visits and browsers without JavaScript.
+const fragmentRoot = document.body.dataset.fragments;
+const fragments = new Map();
+let currentPath = location.pathname;
 
-themeToggle.addEventListener('click', () => {
-    const currentTheme = root.getAttribute('data-theme');
-    const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
-    root.setAttribute('data-theme', newTheme);
-    localStorage.setItem('theme', newTheme);
-});
+function fragmentUrl(path) {
+    if (path.endsWith('/')) path += 'index.html';
+    if (!path.endsWith('.html')) return null;
+    return fragmentRoot + path.slice(1, -'.html'.length) + '.json';
+}
 
-// Simple Search Functionality
-const searchInput = document.getElementById('search-input');
-let searchIndex = [];
-
-// Build search index from page content
-function buildSearchIndex() {
-    const content = document.querySelector('.book-content');
-    if (!content) return;
-    
-    const headings = content.querySelectorAll('h1, h2, h3');
-    headings.forEach(heading => {
-        searchIndex.push({
-            text: heading.textContent,
-            element: heading,
-            level: heading.tagName
+function isFragmentLink(link) {
+    return Boolean(link && link.href && link.origin === location.origin && !link.target &&
+        !link.hasAttribute('download') && fragmentUrl(link.pathname));
+}
+
+function loadFragment(path) {
+    const url = fragmentUrl(path);
+    if (!fragments.has(url)) {
+        const request = fetch(url).then(response => {
+            if (!response.ok) throw new Error(response.status);
+            return response.json();
         });
+        request.catch(() => fragments.delete(url));
+        fragments.set(url, request);
+    }
+    return fragments.get(url);
+}
+
+// Swap in the sidebar asset if the book's navigation changed since this
+// page was loaded, then mark the current page active
+async function updateSidebar(fragment) {
+    let sidebar = document.querySelector('.book-sidebar');
+    if (fragment.sidebar && sidebar.dataset.version !== fragment.sidebar) {
+        const response = await fetch('/assets/sidebar.' + fragment.sidebar + '.html');
+        if (response.ok) {
+            sidebar.outerHTML = await response.text();
+            sidebar = document.querySelector('.book-sidebar');
+        }
+    }
+    sidebar.classList.remove('open');
+    sidebar.querySelectorAll('.sidebar-item').forEach(item => {
+        const link = item.querySelector('a');
+        item.classList.toggle('active', link.getAttribute('href') === fragment.active);
     });
 }
 
-// Search functionality
-searchInput.addEventListener('input', (e) => {
-    const query = e.target.value.toLowerCase();
-    
-    if (query.length < 2) {
-        clearHighlights();
+function prefetchNeighbours() {
+    const links = [...document.querySelectorAll('.book-sidebar .sidebar-item a')];
+    const current = links.findIndex(link => link.parentNode.classList.contains('active'));
+    if (current < 0) return;
+    [links[current - 1], links[current + 1]].forEach(link => {
+        if (link) loadFragment(link.pathname).catch(() => {});
+    });
+}
+
+async function navigate(url, push) {
+    let fragment;
+    try {
+        fragment = await loadFragment(url.pathname);
+    } catch (e) {
+        window.location.href = url.href;
         return;
     }
+    document.querySelector('.book-content').innerHTML = fragment.content;
+    document.title = fragment.title;
+    if (push) history.pushState(null, '', url.href);
+    currentPath = url.pathname;
     
-    clearHighlights();
-    
-    searchIndex.forEach(item => {
-        if (item.text.toLowerCase().includes(query)) {
-            item.element.style.backgroundColor = 'rgba(102, 126, 234, 0.2)';
-            item.element.style.transition = 'background-color 0.3s';
+    let toc = document.querySelector('.book-toc');
+    if (fragment.toc) {
+        if (!toc) {
+            toc = document.createElement('aside');
+            toc.className = 'book-toc';
+            document.querySelector('.book-body').appendChild(toc);
         }
-    });
+        toc.innerHTML = fragment.toc;
+    } else if (toc) {
+        toc.remove();
+    }
+    await updateSidebar(fragment).catch(() => {});
     
-    // Scroll to first match
-    const firstMatch = searchIndex.find(item => 
-        item.text.toLowerCase().includes(query)
-    );
-    if (firstMatch) {
-        firstMatch.element.scrollIntoView({ behavior: 'smooth', block: 'center' });
+    const partLink = partLinkFor(url.hash);
+    if (partLink) {
+        history.replaceState(null, '', partLink);
+        return navigate(new URL(partLink, location.href), false);
     }
-});
+    
+    const target = url.hash && document.getElementById(decodeURIComponent(url.hash.slice(1)));
+    if (target) {
+        target.scrollIntoView();
+    } else if (push) {
+        window.scrollTo(0, 0);
+    }
+    prefetchNeighbours();
+}
 
-function clearHighlights() {
-    searchIndex.forEach(item => {
-        item.element.style.backgroundColor = '';
+if (fragmentRoot && window.fetch && window.history.pushState) {
+    document.addEventListener('click', (e) => {
+        if (e.defaultPrevented || e.button !== 0 || e.metaKey || e.ctrlKey || e.shiftKey || e.altKey) return;
+        const link = e.target.closest('a');
+        if (!isFragmentLink(link)) return;
+        // Anchors within the current page scroll as usual
+        if (link.pathname === location.pathname && link.hash) return;
+        e.preventDefault();
+        searchResults.classList.remove('open');
+        navigate(new URL(link.href), true);
     });
+    
+    window.addEventListener('popstate', () => {
+        if (location.pathname !== currentPath) navigate(new URL(location.href), false);
+    });
+    
+    document.addEventListener('mouseover', (e) => {
+        const link = e.target.closest && e.target.closest('a');
+        if (isFragmentLink(link) && link.pathname !== location.pathname) {
+            loadFragment(link.pathname).catch(() => {});
+        }
+    });
+    
+    (window.requestIdleCallback || setTimeout)(prefetchNeighbours);
+}
+
+// Offline Support
+// Books built with --offline register the service worker at /sw.js, which
+// answers from its cache for assets and visited pages
+const serviceWorkerUrl = document.body.dataset.serviceWorker;
+if (serviceWorkerUrl && 'serviceWorker' in navigator) {
+    navigator.serviceWorker.register(serviceWorkerUrl).catch(() => {});
 }
 
 // Smooth scrolling for anchor links
@@ -635,9 +3340,6 @@ sidebarToggle.addEventListener('click', () => {
     sidebar.classList.toggle('open');
 });
 
-// Initialize
-buildSearchIndex();
-
 // Back to top functionality
 window.addEventListener('scroll', () => {
     if (window.scrollY > 300) {
@@ -675,122 +3377,1527 @@ window.addEventListener('scroll', () => {
 });
 '''
     
+    def generate_highlight_css(self) -> str:
+        """Generate syntax highlighting CSS from the configured Pygments styles"""
+        selector = '.' + MARKDOWN_EXTENSION_CONFIGS['codehilite']['css_class']
+        css = ['/* Code Highlighting */',
+               f'{selector} {{ background: var(--code-bg); padding: 15px; border-radius: 6px; }}']
+        try:
+            from pygments.formatters import HtmlFormatter
+            from pygments.util import ClassNotFound
+        except ImportError:  # blocks are left unhighlighted without Pygments
+            return '\n'.join(css) + '\n'
+        
+        settings = self.config.get('pluginsConfig', {}).get('highlight', {})
+        themes = (('', settings.get('style', PYGMENTS_STYLE), PYGMENTS_STYLE),
+                  ('[data-theme="dark"] ', settings.get('darkStyle', PYGMENTS_DARK_STYLE), PYGMENTS_DARK_STYLE))
+        for prefix, style, default in themes:
+            try:
+                formatter = HtmlFormatter(style=style)
+            except ClassNotFound:
+                print(f"⚠️  Warning: unknown Pygments style '{style}', using '{default}'")
+                formatter = HtmlFormatter(style=default)
+            if prefix:
+                # The light rules still match in dark mode; undo their bold and
+                # italic so only this style's own token rules set them
+                css.append(f'{prefix}{selector} span {{ font-weight: normal; font-style: normal; }}')
+            # Token rules only: the container keeps the theme's --code-bg
+            css.extend(formatter.get_token_style_defs(prefix + selector))
+        return '\n'.join(css) + '\n'
+    
+    def build_assets(self) -> Dict[str, Tuple[str, str]]:
+        """Minified assets keyed by logical name, as (content-hashed file name, content)"""
+        if self._assets is None:
+            sources = {
+                'style.css': minify_css(self.generate_css()),
+                'highlight.css': minify_css(self.generate_highlight_css()),
+                'script.js': minify_js(self.generate_js()),
+            }
+            self._assets = {}
+            for name, content in sources.items():
+                stem, extension = name.rsplit('.', 1)
+                digest = hash_bytes(content.encode('utf-8'))[:10]
+                self._assets[name] = (f"{stem}.{digest}.{extension}", content)
+        return self._assets
+    
+    def asset_url(self, name: str) -> str:
+        """URL of a generated asset, e.g. /assets/style.3f2a9c01de.css"""
+        return f"/assets/{self.build_assets()[name][0]}"
+    
     def copy_assets(self):
-        """Copy or generate necessary assets"""
+        """Copy or generate necessary assets
+        
+        Assets are minified and written under content-hashed names, so they
+        can be served with long-lived immutable cache headers.
+        """
         assets_dir = self.output_dir / "assets"
-        assets_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Generate CSS
-        with open(assets_dir / "style.css", 'w', encoding='utf-8') as f:
-            f.write(self.generate_css())
-        
-        # Generate JavaScript
-        with open(assets_dir / "script.js", 'w', encoding='utf-8') as f:
-            f.write(self.generate_js())
-        
-        # Simple syntax highlighting CSS
-        highlight_css = '''/* Code Highlighting */
-.codehilite { background: var(--code-bg); padding: 15px; border-radius: 6px; }
-.codehilite .c { color: #999; } /* Comment */
-.codehilite .k { color: #e06c75; font-weight: bold; } /* Keyword */
-.codehilite .s { color: #98c379; } /* String */
-.codehilite .n { color: #61afef; } /* Name */
-.codehilite .o { color: #c678dd; } /* Operator */
-'''
-        with open(assets_dir / "highlight.css", 'w', encoding='utf-8') as f:
-            f.write(highlight_css)
+        for file_name, content in self.build_assets().values():
+            self.write_file(assets_dir / file_name, content)
     
-    def build(self):
-        """Build the complete static site"""
-        print("🚀 BookGen - Building your documentation...")
+    def render_page_content(self, source_path: Path) -> Tuple[str, Dict]:
+        """Render a page's Markdown and post-process the HTML for the book"""
+        with self.profiler.stage('render_markdown'):
+            content_html, metadata = self.render_markdown(source_path)
+        with self.profiler.stage('rewrite_links'):
+            content_html = rewrite_links(content_html)
+        with self.profiler.stage('images'):
+            source = source_path.relative_to(self.root_dir).as_posix()
+            content_html = self.images.rewrite(content_html, source, self.root_dir)
+        return content_html, metadata
+    
+    def analyze_page(self, source_hash: str, content_html: str) -> Dict:
+        """Extract what the site-wide indexes need from a rendered page
+        (search terms, anchors and links) and cache it under the source hash.
+        The record also holds the capped term counts related pages are
+        scored from, and the labels of the page's later parts when it is
+        paginated, for the paginate_bytes and record salt it was measured
+        with."""
+        with self.profiler.stage('analyze_page'):
+            anchors, links = extract_links(content_html)
+            search = extract_search_document(content_html)
+            record = {
+                'salt': self.record_salt,
+                'search': search,
+                'terms': RelatedPages.term_counts(search['body']),
+                'anchors': anchors,
+                'links': links,
+                'paginate': self.paginate_bytes,
+                'parts': [part['headings'][0][1] for part in self.paginate('page.html', content_html)[1:]],
+            }
         
-        # Clean and create output directory
-        if self.output_dir.exists():
-            import shutil
-            shutil.rmtree(self.output_dir)
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        records_dir = self.cache_dir / "pages"
+        records_dir.mkdir(parents=True, exist_ok=True)
+        with open(records_dir / f"{source_hash}.json", 'w', encoding='utf-8') as f:
+            json.dump(record, f, separators=(',', ':'))
+        return record
+    
+    def read_page_record(self, source_hash: str) -> Optional[Dict]:
+        """The cached analysis of a source, if it is current"""
+        try:
+            with open(self.cache_dir / "pages" / f"{source_hash}.json", 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get('salt') != self.record_salt or record.get('paginate') != self.paginate_bytes:
+            return None
+        return record
+    
+    def prune_page_records(self, source_hashes: Set[str]):
+        """Delete the page records of sources no longer in the book"""
+        records_dir = self.cache_dir / "pages"
+        if not records_dir.is_dir():
+            return
+        for path in records_dir.glob("*.json"):
+            if path.stem not in source_hashes:
+                path.unlink()
+    
+    def spill_path(self, source_hash: str) -> Path:
+        """Where the analysis pass leaves a rendered page for the page pass"""
+        return self.cache_dir / "spill" / f"{source_hash}.json"
+    
+    def analyze_source(self, title: str, source: str, output: str,
+                       previous: Optional[Dict] = None) -> Tuple[str, List[str]]:
+        """First pass of a build over one page: its source hash and the
+        labels of its later parts.
         
-        # Parse navigation
-        print("📖 Parsing SUMMARY.md...")
-        navigation = self.parse_summary()
+        Pages with a current record (and unchanged images) are not rendered.
+        Others are rendered and analyzed, and the rendered page is spilled to
+        the cache directory so build_page writes it without rendering again.
+        """
+        source_path = self.root_dir / source
+        source_hash = hash_file(source_path)
+        record = self.read_page_record(source_hash)
+        if record is not None and previous and previous.get('images'):
+            if any(hash_file(self.root_dir / image) != image_hash
+                   for image, image_hash in previous['images'].items()):
+                record = None
+        if record is None:
+            with self.profiler.page(output, source):
+                content_html, metadata = self.render_page_content(source_path)
+                record = self.analyze_page(source_hash, content_html)
+                spill = self.spill_path(source_hash)
+                spill.parent.mkdir(parents=True, exist_ok=True)
+                with open(spill, 'w', encoding='utf-8') as f:
+                    json.dump({'html': content_html, 'meta': metadata,
+                               'images': self.images.dependencies.pop(source, None)}, f, separators=(',', ':'))
+        return source_hash, record['parts']
+    
+    def load_page_record(self, source: str, source_hash: str) -> Dict:
+        """Cached analysis of a page, re-rendering it if missing"""
+        record = self.read_page_record(source_hash)
+        if record is None:
+            content_html, _ = self.render_page_content(self.root_dir / source)
+            record = self.analyze_page(source_hash, content_html)
+        return record
+    
+    def related_count(self) -> int:
+        """How many related pages each page lists (0 = none)"""
+        return int(self.config.get('pluginsConfig', {}).get('related', {}).get('count', RELATED_PAGES))
+    
+    def find_related(self, pages: List[Tuple[str, str, str]]) -> Dict[str, List[List[str]]]:
+        """Related pages of every (title, source, output) page, as [output,
+        title] pairs keyed by output.
+        
+        Scores come from the cached page records, which a build's analysis
+        pass (analyze_source) has already written, so nothing is rendered
+        here. The home page is left out.
+        """
+        pages = [page for page in pages if page[2] != 'index.html']
+        hashes = {source: hash_file(self.root_dir / source) for _, source, _ in pages}
+        # Only the capped term counts of each record are kept while scoring
+        documents = {output: (hashes[source], self.load_page_record(source, hashes[source])['terms'])
+                     for _, source, output in pages}
+        scored = RelatedPages(self.cache_dir / "related.json", self.related_count()).update(documents)
+        titles = {output: title for title, _, output in pages}
+        return {output: [[other, titles[other]] for other, _ in pairs]
+                for output, pairs in scored.items() if pairs}
+    
+    def related_block(self, related: Optional[List[List[str]]]) -> str:
+        """The "Related" block appended to a page's content"""
+        if not related:
+            return ""
+        items = ''.join(f'<li><a href="/{output}">{title}</a></li>' for output, title in related)
+        return f'<aside class="book-related"><h4>Related</h4><ul>{items}</ul></aside>'
+    
+    def write_indexes(self, pages: List[Tuple[str, str, str, str, List[str]]], generated: Iterable[str] = ()) -> Dict:
+        """Build the site-wide search index and link report.
         
-        # Copy assets
-        print("🎨 Generating styles and scripts...")
-        self.copy_assets()
+        ``pages`` holds (title, source, output, source hash, part outputs)
+        per output page. Each page's cached record is loaded once and feeds
+        both indexes; a source built to several outputs is searchable once.
+        The parts of a paginated page share its anchors (the client follows
+        an anchor to the part holding it). ``generated`` pages (tag and
+        section listings) can be linked to but are not searchable. Returns
+        the link report.
+        """
+        search = SearchIndex()
+        links = LinkIndex(self.output_exists)
+        seen_sources = set()
         
-        # Collect all pages to build
-        pages_to_build = []
+        for title, source, output, source_hash, parts in pages:
+            record = self.load_page_record(source, source_hash)
+            links.add(output, record)
+            for part in parts:
+                links.add(part, {'anchors': record['anchors'], 'links': []})
+            if source not in seen_sources:
+                seen_sources.add(source)
+                search.add('/' if output == 'index.html' else '/' + output, title, record['search'])
+        for output in generated:
+            links.add(output, {'anchors': [], 'links': []})
+        
+        with self.profiler.stage('search_index'):
+            self.write_search_index(search)
+        with self.profiler.stage('link_check'):
+            report = links.validate()
+            self.write_link_report(report)
+        return report
+    
+    def write_search_index(self, search: SearchIndex):
+        """Write the inverted index to ``search/``.
+        
+        Terms are sharded by their first two characters so the client only
+        fetches the shards a query touches; shard names carry a content
+        hash so they can be cached indefinitely. ``meta.json`` lists the
+        pages and maps shard keys to file names.
+        """
+        shards = search.shards()
+        
+        search_dir = self.output_dir / "search"
+        self.clear_output("search")
+        
+        shard_files = {}
+        for key, terms in shards.items():
+            data = json.dumps(terms, separators=(',', ':'), ensure_ascii=False)
+            name = f"{key.encode('utf-8').hex()}.{hash_bytes(data.encode('utf-8'))[:12]}.json"
+            self.write_file(search_dir / name, data)
+            shard_files[key] = name
+        
+        self.write_file(search_dir / "meta.json",
+                        json.dumps({'docs': search.docs, 'shards': shard_files},
+                                   separators=(',', ':'), ensure_ascii=False))
+        
+        print(f"🔎 Indexed {len(search.docs)} pages ({len(search.postings)} terms, {len(shards)} shards)")
+    
+    def write_link_report(self, report: Dict):
+        """Save the link report to the cache directory and summarize it"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_dir / "links.json", 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        
+        broken = report['broken']
+        print(f"🔗 Checked {report['links']} internal links across {report['pages']} pages: "
+              f"{len(broken)} broken")
+        for link in broken[:10]:
+            print(f"⚠️  {link['page']}: {link['href']} ({link['reason']})")
+        if len(broken) > 10:
+            print(f"   ...and {len(broken) - 10} more, see {self.cache_dir / 'links.json'}")
+    
+    def audit_budgets(self) -> Tuple[int, int]:
+        """Uncompressed and gzip page budgets in bytes, from
+        ``pluginsConfig.audit`` (``budget``/``compressedBudget`` in KiB, 0 = none)"""
+        audit = self.config.get('pluginsConfig', {}).get('audit', {})
+        return (int(audit.get('budget', AUDIT_BUDGET_BYTES // 1024)) * 1024,
+                int(audit.get('compressedBudget', 0)) * 1024)
+    
+    def audit(self, budget: int, compressed_budget: int = 0) -> List[Dict]:
+        """Weigh every HTML page of the published book (see page_weight),
+        marking the pages over either budget (0 = no budget)"""
+        if not self.publish_dir.exists():
+            raise FileNotFoundError(f"{self.publish_dir} not found, build the book first")
+        rows = []
+        for relative in sorted(list_files(self.publish_dir)):
+            if not relative.endswith('.html') or relative.startswith('assets/'):
+                continue
+            row = {'path': relative, **page_weight((self.publish_dir / relative).read_bytes())}
+            row['over_budget'] = bool((budget and row['total'] > budget)
+                                      or (compressed_budget and row['gzip'] > compressed_budget))
+            rows.append(row)
+        return rows
+    
+    def write_audit_report(self, rows: List[Dict], report_format: str = 'table',
+                           output: Optional[Path] = None):
+        """Print or save the audit rows as a table, JSON or CSV, followed by
+        a summary (on stderr when the report itself goes to stdout)"""
+        columns = AUDIT_COLUMNS + ('over_budget',)
+        with open(output, 'w', encoding='utf-8', newline='') if output else nullcontext(sys.stdout) as f:
+            if report_format == 'json':
+                json.dump(rows, f, indent=2)
+                f.write('\n')
+            elif report_format == 'csv':
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                f.write(f"{'KiB':>8} {'shell':>7} {'sidebar':>8} {'toc':>6} {'content':>8} "
+                        f"{'highlight':>9} {'gzip':>6}  page\n")
+                for row in rows:
+                    flag = ' ⚠️' if row['over_budget'] else ''
+                    f.write(' '.join(f"{row[column] / 1024:>{width}.1f}" for column, width in
+                                     (('total', 8), ('shell', 7), ('sidebar', 8), ('toc', 6),
+                                      ('content', 8), ('highlight', 9), ('gzip', 6)))
+                            + f"  {row['path']}{flag}\n")
+        
+        log = sys.stderr if report_format != 'table' and not output else sys.stdout
+        total = sum(row['total'] for row in rows) or 1
+        shares = ', '.join(f"{column} {100 * sum(row[column] for row in rows) / total:.0f}%"
+                           for column in ('shell', 'sidebar', 'toc', 'content'))
+        print(f"📏 Audited {len(rows)} pages, {total / 1024:.1f} KiB of HTML: {shares}", file=log)
+        # Highlight markup is part of content, so it is reported as a share of it
+        content = sum(row['content'] for row in rows) or 1
+        print(f"   of content: highlight markup {100 * sum(row['highlight'] for row in rows) / content:.0f}%",
+              file=log)
+        if output:
+            print(f"   Report written to {output}", file=log)
+        over = [row for row in rows if row['over_budget']]
+        if over:
+            print(f"❌ {len(over)} pages over budget", file=log)
+    
+    def paginate(self, output: str, content_html: str) -> List[Dict]:
+        """Split rendered content that exceeds paginate_bytes into parts at h2
+        boundaries, each with its output path; [] when the page fits"""
+        if not self.paginate_bytes or len(content_html) <= self.paginate_bytes:
+            return []
+        parts = split_sections(content_html, self.paginate_bytes)
+        if len(parts) < 2:
+            return []
+        for number, part in enumerate(parts, 1):
+            part['output'] = self.part_output(output, number)
+        return parts
+    
+    @staticmethod
+    def part_output(output: str, number: int) -> str:
+        """Output path of part ``number`` (from 1) of a paginated page"""
+        return output if number == 1 else f"{output[:-len('.html')]}-part-{number}.html"
+    
+    def parts_toc(self, title: str, parts: List[Dict], current: int) -> str:
+        """Table of contents listing every part of a paginated page and its sections"""
+        items = []
+        for number, part in enumerate(parts):
+            active = ' class="active"' if number == current else ''
+            label = part['headings'][0][1] if number else title
+            sections = ''.join(f'<li><a href="/{part["output"]}#{anchor}">{name}</a></li>'
+                               for anchor, name in part['headings'])
+            # Every id in the part, so links to any of them reach the right part
+            anchors = html.escape(' '.join(part['anchors']))
+            items.append(f'<li{active}><a href="/{part["output"]}" data-anchors="{anchors}">{label}</a>'
+                         f'{f"<ul>{sections}</ul>" if sections else ""}</li>')
+        return f'<nav class="page-parts"><h4>On this page</h4><ol>{"".join(items)}</ol></nav>'
+    
+    def page_links(self, source: str) -> Tuple[str, str]:
+        """Breadcrumbs to a page and the previous/next pager below it, from
+        its place in the SUMMARY.md tree (empty for unlisted pages)"""
+        node = self.navigation.find(source) if self.navigation else None
+        if node is None:
+            return "", ""
         
-        def collect_pages(items):
-            for item in items:
-                if item['type'] == 'page':
-                    pages_to_build.append(item)
-                elif item['type'] == 'section' and 'items' in item:
-                    collect_pages(item['items'])
+        breadcrumbs = ""
+        ancestors = node.ancestors()
+        if ancestors:
+            crumbs = [f'<a href="/{item.output}">{item.title}</a>' if item.kind == 'page'
+                      else f'<span>{item.title}</span>' for item in ancestors]
+            crumbs.append(f'<span aria-current="page">{node.title}</span>')
+            breadcrumbs = f'<nav class="book-breadcrumbs">{" › ".join(crumbs)}</nav>'
         
-        collect_pages(navigation)
+        links = []
+        if node.prev:
+            links.append(f'<a class="book-pager-prev" href="/{node.prev.output}">← {node.prev.title}</a>')
+        if node.next:
+            links.append(f'<a class="book-pager-next" href="/{node.next.output}">{node.next.title} →</a>')
+        pager = f'<nav class="book-pager">{"".join(links)}</nav>' if links else ""
+        return breadcrumbs, pager
+    
+    def publish_page(self, sidebar: CompiledSidebar, title: str, source: str,
+                     output: str, content_html: str, related: str = ""):
+        """Write a page, or each part of it when it is oversized.
+        
+        Parts after the first go to ``<page>-part-N.html``. Every part carries a
+        TOC of all parts and previous/next links, and the sidebar marks the
+        part being shown. ``related`` is the page's related-pages block; the
+        breadcrumbs and book pager (see page_links) frame every part.
+        """
+        breadcrumbs, pager = self.page_links(source)
+        related += pager
+        parts = self.paginate(output, content_html)
+        if not parts:
+            self.write_page(sidebar, title, source, output, breadcrumbs + content_html, related=related)
+            return
+        
+        for number, part in enumerate(parts):
+            links = []
+            if number > 0:
+                links.append(f'<a class="page-parts-prev" href="/{parts[number - 1]["output"]}">← Previous part</a>')
+            if number + 1 < len(parts):
+                links.append(f'<a class="page-parts-next" href="/{parts[number + 1]["output"]}">'
+                             f'Next: {parts[number + 1]["headings"][0][1]} →</a>')
+            part_html = breadcrumbs + part['html'] + f'<nav class="page-parts-nav">{"".join(links)}</nav>'
+            part_title = title if number == 0 else f"{title}: {part['headings'][0][1]}"
+            self.write_page(sidebar, part_title, source, part['output'], part_html,
+                            toc=self.parts_toc(title, parts, number),
+                            active=source if number == 0 else part['output'], related=related)
+    
+    def load_timestamps(self, sources: Iterable[str]) -> Dict[str, int]:
+        """Footer timestamps for the pages, fixed for a given commit.
+        
+        SOURCE_DATE_EPOCH wins when set. Otherwise every page gets the time of
+        the last commit touching it, from a single batched git log pass; pages
+        git does not know fall back to their file's mtime (see page_timestamp).
+        """
+        sources = set(sources)
+        epoch = os.environ.get('SOURCE_DATE_EPOCH')
+        if epoch:
+            return dict.fromkeys(sources, int(epoch))
+        return git_commit_times(self.root_dir, sources)
+    
+    def page_epoch(self, source: str) -> int:
+        """Footer timestamp of a page, as seconds since the epoch"""
+        if source not in self.timestamps:
+            source_path = self.root_dir / source
+            self.timestamps[source] = int(source_path.stat().st_mtime) if source_path.exists() else 0
+        return self.timestamps[source]
+    
+    def page_timestamp(self, source: str) -> str:
+        """Formatted footer timestamp of a page"""
+        return format_timestamp(self.page_epoch(source))
+    
+    def build_page(self, sidebar: CompiledSidebar, title: str, source: str,
+                   output: str, previous: Optional[Dict] = None,
+                   related: Optional[List[List[str]]] = None,
+                   parts: Optional[List[str]] = None) -> Tuple[Dict, bool]:
+        """Render one page to the output directory.
+        
+        Returns the page's manifest entry and whether it was rendered. When
+        ``previous`` (the entry from the last build) matches and the output
+        is still on disk, the page is left untouched. The entry also records
+        the images the page embeds, so editing one rebuilds the page, its
+        ``related`` pages as [output, title] pairs (see find_related), the
+        outputs of its later ``parts`` (labels from analyze_source), the
+        version of the ``sidebar`` it embeds (another page's parts change
+        it) and its front matter (``meta``) for the MetadataIndex. A page spilled by
+        analyze_source is written from the spill instead of being rendered.
+        """
+        source_path = self.root_dir / source
+        entry = {
+            'source': source,
+            'title': title,
+            'hash': hash_file(source_path),
+            'updated': self.page_timestamp(source),
+            'sidebar': sidebar.version,
+        }
+        if parts:
+            entry['parts'] = [self.part_output(output, number) for number in range(2, len(parts) + 2)]
+        if related:
+            entry['related'] = related
+        if previous and previous.get('meta') and previous['hash'] == entry['hash']:
+            entry['meta'] = previous['meta']
+        if previous and previous.get('images'):
+            entry['images'] = {image: hash_file(self.root_dir / image) for image in previous['images']}
+        if previous == entry and self.output_exists(output):
+            return entry, False
+        
+        with self.profiler.page(output, source):
+            spill = self.spill_path(entry['hash'])
+            if spill.exists():
+                with open(spill, 'r', encoding='utf-8') as f:
+                    spilled = json.load(f)
+                content_html, metadata, images = spilled['html'], spilled['meta'], spilled['images']
+            else:
+                content_html, metadata = self.render_page_content(source_path)
+                images = self.images.dependencies.pop(source, None)
+            self.publish_page(sidebar, title, source, output, content_html,
+                              self.related_block(related))
+        
+        entry.pop('meta', None)
+        if metadata:
+            entry['meta'] = metadata
+        entry.pop('images', None)
+        if images:
+            entry['images'] = images
+        return entry, True
+    
+    def write_page(self, sidebar: CompiledSidebar, title: str, source: str,
+                   output: str, content_html: str, toc: str = "", active: Optional[str] = None,
+                   related: str = ""):
+        """Stream rendered page content, wrapped in the sidebar and page shell,
+        to its output file (the template is filled as it is written).
+        ``active`` is the sidebar key to highlight when it is not ``source``."""
+        template = self.compile_html_template(self.config)
+        saved = template.saved + sidebar.saved
+        if self.minify:
+            with self.profiler.stage('minify'):
+                minified = minify_html(content_html)
+                saved += len(content_html) - len(minified)
+                content_html = minified
+        chunks = template.iter_chunks(title, content_html, sidebar.iter_chunks(active or source),
+                                      toc, timestamp=self.page_timestamp(source), related=related)
+        
+        with self.profiler.stage('write'):
+            size = self.write_chunks(self.output_dir / output, chunks)
+            self.minified[0] += size + saved
+            self.minified[1] += size
+            if self.fragments:
+                self.write_fragment(sidebar, title, active or source, output, content_html + related, toc)
+    
+    def fragment_path(self, output: str) -> Path:
+        """Where the content-only fragment of an output page goes (docs/a.html -> fragments/docs/a.json)"""
+        return self.output_dir / "fragments" / f"{output[:-len('.html')]}.json"
+    
+    def write_fragment(self, sidebar: CompiledSidebar, title: str, source: str,
+                       output: str, content_html: str, toc: str = ""):
+        """Write the JSON fragment the client swaps into .book-content on navigation"""
+        fragment = {
+            'title': f"{title} - {self.config.get('title', 'Documentation')}",
+            'content': content_html,
+            'toc': toc,
+            'active': f"/{source.replace('.md', '.html')}",
+            'sidebar': sidebar.version,
+        }
+        self.write_file(self.fragment_path(output), json.dumps(fragment, ensure_ascii=False, separators=(',', ':')))
+    
+    def write_sidebar_asset(self, sidebar: CompiledSidebar):
+        """Publish the sidebar (no item active) as an immutable asset for fragment navigation"""
+        self.write_file(self.output_dir / "assets" / f"sidebar.{sidebar.version}.html", sidebar.html)
+    
+    def write_service_worker(self):
+        """Write the precache manifest (every output file with its content
+        hash) and the service worker that serves from it.
+        
+        Hashes are remembered in ``.bookgen-cache/precache.json`` by size and
+        mtime; unchanged outputs keep their mtime, so an incremental build
+        only hashes the files it rewrote. A packed build already knows every
+        file's hash. The worker embeds the manifest's own hash, so browsers
+        install it again after every deploy that changes a file.
+        """
+        def precached(relative: str) -> bool:
+            return relative not in ('sw.js', 'precache-manifest.json') and not relative.endswith(('.gz', '.br'))
+        
+        if self.packer is not None:
+            files = {relative: digest[:10] for relative, digest in self.packer.files().items()
+                     if precached(relative)}
+        else:
+            state_path = self.cache_dir / "precache.json"
+            known = {}
+            if state_path.exists():
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    known = json.load(f)
+            
+            state = {}
+            for relative in sorted(filter(precached, list_files(self.output_dir))):
+                stat = (self.output_dir / relative).stat()
+                signature = [stat.st_size, stat.st_mtime_ns]
+                entry = known.get(relative)
+                if not entry or entry[:2] != signature:
+                    entry = signature + [hash_file(self.output_dir / relative)[:10]]
+                state[relative] = entry
+            
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(state_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, separators=(',', ':'))
+            files = {relative: entry[2] for relative, entry in state.items()}
+        
+        manifest = json.dumps({'files': files}, separators=(',', ':'), sort_keys=True)
+        version = hash_bytes(manifest.encode('utf-8'))[:10]
+        self.write_file(self.output_dir / "precache-manifest.json", manifest)
+        self.write_file(self.output_dir / "sw.js",
+                        f"const VERSION = '{version}';\nconst MAX_PAGES = {SERVICE_WORKER_MAX_PAGES};\n"
+                        + minify_js(SERVICE_WORKER_SCRIPT))
+        print(f"📴 Service worker precaches {len(files)} files (version {version})")
+    
+    def page_sections(self, navigation: Navigation) -> Dict[str, str]:
+        """Title of the nearest SUMMARY section of every page path listed under one"""
+        return {path: node.section.title for path, node in navigation.nodes.items() if node.section}
+    
+    def collection_list(self, index: MetadataIndex, outputs: List[str]) -> str:
+        """Linked list of pages with their description and last update"""
+        items = []
+        for output in outputs:
+            page = index.pages[output]
+            description = ' '.join(page['meta'].get('description', []))
+            items.append(f'<li><a href="{page["url"]}">{page["title"]}</a>'
+                         f'<span class="collection-updated">{page["updated"] or ""}</span>'
+                         f'{f"<p>{html.escape(description)}</p>" if description else ""}</li>')
+        return f'<ul class="collection-list">{"".join(items)}</ul>'
+    
+    def write_collections(self, sidebar: CompiledSidebar, index: MetadataIndex) -> List[str]:
+        """Write the tag pages, section listings and catalog.json from the
+        metadata index, returning the output paths written.
+        
+        Collection pages are stamped with the latest update among the pages
+        they list.
+        """
+        collections = []
         
+        def write_collection(output: str, title: str, content_html: str, outputs: List[str]):
+            sources = [index.pages[listed]['source'] for listed in outputs]
+            self.timestamps[output] = max((self.page_epoch(source) for source in sources), default=0)
+            self.write_page(sidebar, title, output, output, content_html)
+            collections.append(output)
+        
+        tags = index.tags()
+        if tags:
+            tag_outputs = index.tag_outputs()
+            items = ''.join(f'<li><a href="/{tag_outputs[tag]}">{html.escape(tag)}</a> '
+                            f'<span class="collection-count">{len(outputs)}</span></li>'
+                            for tag, outputs in tags.items())
+            write_collection("tags/index.html", "Tags",
+                             f'<h1>Tags</h1><ul class="collection-tags">{items}</ul>',
+                             [output for outputs in tags.values() for output in outputs])
+            for tag, outputs in tags.items():
+                write_collection(tag_outputs[tag], f"Tag: {html.escape(tag)}",
+                                 f'<h1>Tag: {html.escape(tag)}</h1>{self.collection_list(index, outputs)}',
+                                 outputs)
+        
+        sections = index.sections()
+        section_outputs = index.section_outputs()
+        for title, outputs in sections.items():
+            write_collection(section_outputs[title], title,
+                             f'<h1>{title}</h1>{self.collection_list(index, outputs)}', outputs)
+        
+        self.write_file(self.output_dir / "catalog.json",
+                        json.dumps(index.catalog(), ensure_ascii=False, separators=(',', ':')))
+        collections.append("catalog.json")
+        print(f"🏷️  Generated {len(tags)} tag pages, {len(sections)} section listings and catalog.json")
+        return collections
+    
+    def iter_pages(self, pages_to_build: List[NavNode]) -> Iterator[Tuple[str, str, str]]:
+        """Yield (title, source, output) for the home page and every page
+        whose source exists, warning about the missing ones"""
         # Build index page (readme.md)
         readme_path = self.root_dir / "readme.md"
         if readme_path.exists():
             print("🏠 Building home page...")
-            sidebar_html = self.generate_sidebar(navigation, "readme.md")
-            content_html, metadata = self.render_markdown(readme_path)
-            
-            full_html = self.generate_html_template(
-                title="Home",
-                content=content_html,
-                sidebar=sidebar_html,
-                config=self.config
-            )
-            
-            index_output = self.output_dir / "index.html"
-            with open(index_output, 'w', encoding='utf-8') as f:
-                f.write(full_html)
+            yield "Home", "readme.md", "index.html"
         
         # Build all pages
         print(f"📝 Building {len(pages_to_build)} pages...")
         for page in pages_to_build:
-            page_path = self.root_dir / page['path']
+            page_path = self.root_dir / page.path
             if not page_path.exists():
-                print(f"⚠️  Warning: {page['path']} not found, skipping...")
+                print(f"⚠️  Warning: {page.path} not found, skipping...")
                 continue
             
-            sidebar_html = self.generate_sidebar(navigation, page['path'])
-            content_html, metadata = self.render_markdown(page_path)
+            yield page.title, page.path, page.output
+    
+    def build(self, incremental: bool = False, jobs: int = 1, profile: bool = False,
+              profile_output: Optional[Path] = None, strict_links: bool = False,
+              deploy_manifest: Optional[Path] = None):
+        """Build the complete static site
+        
+        With ``incremental`` set, the manifest from the previous build is
+        used to skip pages whose source and shared inputs are unchanged.
+        With ``jobs`` > 1, pages are rendered in a pool of worker processes,
+        each holding its own Markdown instance. With ``profile`` set, stage,
+        page and extension timings are printed and written as JSON to
+        ``profile_output`` (default ``.bookgen-cache/profile.json``). With
+        ``strict_links`` set, broken internal links fail the build.
+        
+        Output is staged and swapped in once complete, files with unchanged
+        bytes keep their mtime, and the added/changed/removed paths are
+        written to ``deploy_manifest`` (default ``.bookgen-cache/deploy.json``).
+        With an ``output_backend`` other than ``dir`` files are written
+        straight into the archive or store (see packed_output); an
+        incremental build carries the skipped pages over from the previous one.
+        """
+        print("🚀 BookGen - Building your documentation...")
+        build_start = time.perf_counter()
+        self.enable_profiling(profile)
+        if self.precompress and not brotli:
+            print("⚠️  Warning: brotli is not installed, writing .gz siblings only...")
+        
+        self.minified = [0, 0]
+        manifest = self.load_manifest() if incremental else {}
+        fingerprint = self.compute_fingerprint()
+        packed = self.output_backend != 'dir'
+        full_rebuild = (
+            not incremental
+            or not (self.load_packed_index() if packed else self.publish_dir.exists())
+            or manifest.get('version') != MANIFEST_VERSION
+            or manifest.get('fingerprint') != fingerprint
+        )
+        previous_pages = {} if full_rebuild else manifest.get('pages', {})
+        
+        if incremental and full_rebuild:
+            print("♻️  Shared inputs changed, doing a full rebuild...")
+        
+        # Parse navigation
+        print("📖 Parsing SUMMARY.md...")
+        with self.profiler.stage('parse_summary'):
+            navigation = self.load_navigation()
+        
+        # Collect all pages to build
+        pages_to_build = navigation.pages
+        
+        with self.profiler.stage('timestamps'):
+            self.timestamps = self.load_timestamps(["readme.md"] + [page.path for page in pages_to_build])
+        
+        # A full rebuild starts from an empty staging directory (or archive);
+        # unchanged files are still linked back from the published tree as
+        # written, and a packed build carries over the files it skips
+        output = self.packed_output if packed else self.staged_output
+        with output(seed=not full_rebuild):
+            # Copy assets
+            if full_rebuild:
+                print("🎨 Generating styles and scripts...")
+                with self.profiler.stage('copy_assets'):
+                    self.copy_assets()
+            
+            shutil.rmtree(self.cache_dir / "spill", ignore_errors=True)
+            pages = {}
+            index_pages = []
+            rendered = 0
             
-            full_html = self.generate_html_template(
-                title=page['title'],
-                content=content_html,
-                sidebar=sidebar_html,
-                config=self.config
-            )
+            def record(task, entry, changed):
+                nonlocal rendered
+                title, source, output = task[:3]
+                pages[output] = entry
+                index_pages.append((title, source, output, entry['hash'], entry.get('parts', [])))
+                rendered += changed
             
-            # Create output path
-            output_path = self.output_dir / page['path'].replace('.md', '.html')
-            output_path.parent.mkdir(parents=True, exist_ok=True)
+            with ExitStack() as stack:
+                pool = None
+                if jobs > 1:
+                    pool = stack.enter_context(ProcessPoolExecutor(
+                        max_workers=jobs, initializer=_init_worker,
+                        initargs=(str(self.root_dir), self.worker_options(), self.timestamps,
+                                  navigation, self.profiler.enabled,
+                                  self.packer.files() if packed else None)))
+                
+                # The sidebar lists the parts of paginated pages and related
+                # pages need every page's text, so a first pass measures each
+                # page (rendering only those without a current record) before
+                # any page is written
+                page_list = list(self.iter_pages(pages_to_build))
+                analyses = (task + (previous_pages.get(task[2]),) for task in page_list)
+                parts = {}
+                source_hashes = set()
+                if pool:
+                    for task, (source_hash, page_parts, profile_data, files) in bounded_map(
+                            pool, _analyze_page_worker, analyses, jobs * 4):
+                        if profile_data:
+                            self.profiler.merge(profile_data)
+                        self.pack_files(files)
+                        source_hashes.add(source_hash)
+                        if page_parts:
+                            parts[task[1]] = page_parts
+                else:
+                    for task in analyses:
+                        source_hash, page_parts = self.analyze_source(*task)
+                        source_hashes.add(source_hash)
+                        if page_parts:
+                            parts[task[1]] = page_parts
+                self.prune_page_records(source_hashes)
+                
+                with self.profiler.stage('generate_sidebar'):
+                    sidebar = self.compile_sidebar(navigation, parts)
+                    if self.fragments:
+                        self.write_sidebar_asset(sidebar)
+                    if pool:
+                        sidebar.save(self.cache_dir / "sidebar.json")
+                
+                related = {}
+                if self.related_count() > 0:
+                    with self.profiler.stage('related_pages'):
+                        related = self.find_related(page_list)
+                
+                # (title, source, output, previous manifest entry, related pages, parts) tasks
+                tasks = (task + (previous_pages.get(task[2]), related.get(task[2]), parts.get(task[1]))
+                         for task in page_list)
+                if pool:
+                    for task, (entry, changed, profile_data, minified, files) in bounded_map(
+                            pool, _build_page_worker, ((sidebar.version,) + task for task in tasks), jobs * 4):
+                        if profile_data:
+                            self.profiler.merge(profile_data)
+                        self.pack_files(files)
+                        self.minified = [a + b for a, b in zip(self.minified, minified)]
+                        record(task[1:], entry, changed)
+                else:
+                    for task in tasks:
+                        record(task, *self.build_page(sidebar, *task))
+            shutil.rmtree(self.cache_dir / "spill", ignore_errors=True)
+            
+            with self.profiler.stage('collections'):
+                metadata = MetadataIndex()
+                sections = self.page_sections(navigation)
+                for output, entry in pages.items():
+                    metadata.add(output, entry, None if output == 'index.html' else sections.get(entry['source']))
+                collections = self.write_collections(sidebar, metadata)
+                for output in set(manifest.get('collections', [])) - set(collections):
+                    self.remove_output(self.output_dir / output)
+                    if self.fragments and output.endswith('.html'):
+                        self.remove_output(self.fragment_path(output))
+            
+            link_report = self.write_indexes(index_pages, collections)
             
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(full_html)
+            # Remove pages (and parts of paginated pages) that are no longer part of the book
+            def outputs(entries: Dict[str, Dict]) -> Set[str]:
+                return {path for output, entry in entries.items()
+                        for path in [output] + entry.get('parts', [])}
+            
+            for output in outputs(previous_pages) - outputs(pages):
+                self.remove_output(self.output_dir / output)
+                if self.fragments:
+                    self.remove_output(self.fragment_path(output))
+            
+            # Copy .nojekyll if exists
+            nojekyll = self.root_dir / ".nojekyll"
+            if nojekyll.exists():
+                self.copy_output(nojekyll, ".nojekyll")
+            
+            if self.offline:
+                with self.profiler.stage('service_worker'):
+                    self.write_service_worker()
+            
+            with self.profiler.stage('publish'):
+                delta = self.pack_output() if packed else self.diff_outputs()
+        
+        self.write_deploy_manifest(delta, deploy_manifest)
+        
+        if self.render_cache:
+            with self.profiler.stage('cache_prune'):
+                self.render_cache.prune()
+                self.highlight_cache.prune()
+        
+        self.save_manifest({
+            'version': MANIFEST_VERSION,
+            'fingerprint': fingerprint,
+            'pages': pages,
+            'collections': collections,
+        })
+        
+        print(f"✅ Build complete! Output in {self.packed_path() if packed else self.output_dir}")
+        if full_rebuild:
+            print(f"📊 Generated {len(pages_to_build) + 1} pages")
+        else:
+            print(f"📊 Rebuilt {rendered} of {len(pages)} pages")
+        before, after = self.minified
+        if (self.minify or self.critical_css) and before:
+            # Net of the critical CSS inlined into every page
+            print(f"🗜️  Page HTML: {before / 1024:.1f} KiB → {after / 1024:.1f} KiB "
+                  f"(saved {(before - after) / 1024:.1f} KiB, {100 * (before - after) / before:.1f}%)")
+        
+        if profile:
+            report = self.profiler.report(time.perf_counter() - build_start, jobs)
+            profile_output = Path(profile_output or self.cache_dir / "profile.json")
+            profile_output.parent.mkdir(parents=True, exist_ok=True)
+            with open(profile_output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(self.profiler.summarize(report))
+            print(f"   Report written to {profile_output}")
+        
+        if strict_links and link_report['broken']:
+            raise RuntimeError(f"{len(link_report['broken'])} broken internal links")
+
+# Per-process state for parallel builds, set up once by _init_worker
+_worker_generator: Optional[BookGen] = None
+_worker_sidebar: Optional[CompiledSidebar] = None
+
+
+def _init_worker(root_dir: str, options: Dict, timestamps: Dict[str, int],
+                 navigation: Navigation, profile: bool = False, packed: Optional[Dict[str, str]] = None):
+    """Give each worker process its own BookGen and Markdown instance. In a
+    packed build (``packed`` holds the files already in the output), the
+    files a worker writes are handed back to the parent."""
+    global _worker_generator, _worker_sidebar
+    _worker_generator = BookGen(root_dir, **options)
+    _worker_generator.timestamps = timestamps
+    _worker_generator.navigation = navigation
+    if packed is not None:
+        _worker_generator.packer = PendingOutput(packed)
+    _worker_sidebar = None
+    if profile:
+        _worker_generator.enable_profiling()
+
+
+def _worker_files() -> Optional[List[Tuple[str, bytes]]]:
+    """Files written by the current task of a packed build"""
+    packer = _worker_generator.packer
+    return packer.drain() if packer is not None else None
+
+
+def _analyze_page_worker(task: Tuple) -> Tuple[str, List[str], Optional[Dict], Optional[List]]:
+    """Run the analysis pass (BookGen.analyze_source) for one page inside a
+    worker process, returning its profile data and packed files"""
+    source_hash, parts = _worker_generator.analyze_source(*task)
+    profiler = _worker_generator.profiler
+    return source_hash, parts, profiler.drain() if profiler.enabled else None, _worker_files()
+
+
+def _build_page_worker(task: Tuple) -> Tuple[Dict, bool, Optional[Dict], List[int], Optional[List]]:
+    """Build one page inside a worker process, returning its profile data,
+    minification byte counts and packed files. The sidebar is compiled
+    after the pool starts, so it is loaded from the cache directory by its
+    version (the first element of the task)."""
+    global _worker_sidebar
+    version, task = task[0], task[1:]
+    if _worker_sidebar is None or _worker_sidebar.version != version:
+        _worker_sidebar = CompiledSidebar.load(_worker_generator.cache_dir / "sidebar.json")
+    entry, changed = _worker_generator.build_page(_worker_sidebar, *task)
+    profiler = _worker_generator.profiler
+    minified, _worker_generator.minified = _worker_generator.minified, [0, 0]
+    return entry, changed, profiler.drain() if profiler.enabled else None, minified, _worker_files()
+
+
+# Endpoint the live-reload client listens on for server-sent events
+LIVE_RELOAD_PATH = '/__bookgen__/events'
+
+LIVE_RELOAD_SCRIPT = f'''<script>
+new EventSource('{LIVE_RELOAD_PATH}').onmessage = () => location.reload();
+</script>
+'''
+
+
+# Body of the service worker written by BookGen.write_service_worker, after
+# the VERSION and MAX_PAGES constants. Responses are cached under their
+# path plus ?v=<content hash> from the precache manifest, so a deploy
+# invalidates exactly the entries whose hash changed.
+SERVICE_WORKER_SCRIPT = '''
+const MANIFEST_URL = '/precache-manifest.json';
+const ASSETS = 'bookgen-assets';
+const PAGES = 'bookgen-pages';
+const STATE = 'bookgen-state';
+let files = null;
+
+// Manifest key of a URL: its path without the leading slash
+function manifestKey(url) {
+    let path = new URL(url, self.location.origin).pathname;
+    if (path.endsWith('/')) path += 'index.html';
+    return decodeURIComponent(path.slice(1));
+}
+
+function cacheKey(key, hash) {
+    return '/' + encodeURI(key) + '?v=' + hash;
+}
+
+async function currentFiles() {
+    if (!files) {
+        const response = await (await caches.open(STATE)).match('manifest');
+        files = response ? (await response.json()).files : {};
+    }
+    return files;
+}
+
+// Fetch this version's manifest and precache the assets it lists that
+// are not cached under their current hash yet
+self.addEventListener('install', event => {
+    event.waitUntil((async () => {
+        const response = await fetch(MANIFEST_URL, { cache: 'no-store' });
+        if (!response.ok) throw new Error(response.status);
+        const manifest = await response.json();
+        await (await caches.open(STATE)).put('manifest-' + VERSION, new Response(JSON.stringify(manifest)));
+        
+        const assets = await caches.open(ASSETS);
+        const cached = new Set((await assets.keys()).map(request => request.url));
+        await Promise.all(Object.entries(manifest.files)
+            .filter(([key, hash]) => key.startsWith('assets/') &&
+                !cached.has(new URL(cacheKey(key, hash), self.location.origin).href))
+            .map(async ([key, hash]) => {
+                const asset = await fetch('/' + encodeURI(key), { cache: 'no-cache' });
+                if (asset.ok) await assets.put(cacheKey(key, hash), asset);
+            }));
+        await self.skipWaiting();
+    })());
+});
+
+// Make the new manifest current and drop every entry cached under a hash
+// it no longer lists
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const state = await caches.open(STATE);
+        const next = await state.match('manifest-' + VERSION);
+        if (next) {
+            await state.put('manifest', next);
+            await state.delete('manifest-' + VERSION);
+            files = null;
+        }
+        const current = await currentFiles();
+        for (const name of [ASSETS, PAGES]) {
+            const cache = await caches.open(name);
+            for (const request of await cache.keys()) {
+                const url = new URL(request.url);
+                if (current[manifestKey(url)] !== url.searchParams.get('v')) await cache.delete(request);
+            }
+        }
+        await self.clients.claim();
+    })());
+});
+
+// Keep the most recently cached pages only
+async function trimPages(cache) {
+    const keys = await cache.keys();
+    await Promise.all(keys.slice(0, Math.max(0, keys.length - MAX_PAGES)).map(key => cache.delete(key)));
+}
+
+// Cache-first for every file of the build, keyed by its content hash;
+// anything else goes to the network
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (request.method !== 'GET' || url.origin !== self.location.origin || url.search) return;
+    event.respondWith((async () => {
+        const key = manifestKey(url);
+        const hash = (await currentFiles())[key];
+        if (!hash) return fetch(request);
+        const cache = await caches.open(key.startsWith('assets/') ? ASSETS : PAGES);
+        const cached = await cache.match(cacheKey(key, hash));
+        if (cached) return cached;
+        
+        const response = await fetch(request);
+        if (response.ok && response.type === 'basic' && !response.redirected) {
+            await cache.put(cacheKey(key, hash), response.clone());
+            if (!key.startsWith('assets/')) trimPages(cache);
+        }
+        return response;
+    })());
+});
+'''
+
+
+class LiveReloadHandler(SimpleHTTPRequestHandler):
+    """Serve the built book, injecting the live-reload client into pages"""
+    
+    server_version = "BookGen"
+    
+    def do_GET(self):
+        if self.path == LIVE_RELOAD_PATH:
+            self.stream_reloads()
+            return
+        
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.split('?', 1)[0].endswith('/'):
+            path = os.path.join(path, 'index.html')
+        if not (path.endswith('.html') and os.path.isfile(path)):
+            super().do_GET()
+            return
+        
+        with open(path, 'rb') as f:
+            body = f.read()
+        body = body.replace(b'</body>', LIVE_RELOAD_SCRIPT.encode('utf-8') + b'</body>', 1)
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def stream_reloads(self):
+        """Hold the connection open and send an event after every rebuild"""
+        dev_server = self.server.dev_server
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        
+        generation = dev_server.generation
+        try:
+            while True:
+                with dev_server.rebuilt:
+                    dev_server.rebuilt.wait_for(lambda: dev_server.generation != generation, timeout=15)
+                if dev_server.generation != generation:
+                    generation = dev_server.generation
+                    self.wfile.write(b'data: reload\n\n')
+                else:
+                    self.wfile.write(b': keep-alive\n\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+    
+    def log_message(self, format, *args):
+        # Keep the console for build output; only report failed requests
+        if len(args) > 1 and str(args[1]).startswith(('4', '5')):
+            super().log_message(format, *args)
+
+
+class DevServer:
+    """Local preview server that rebuilds only what a change affects.
+    
+    An edited page re-renders just that page, a SUMMARY.md change rewrites
+    every page with a new sidebar and a book.json change rewrites every page
+    shell; in both cases the rendered Markdown is reused from memory. Tag
+    pages, section listings and catalog.json are rewritten when a page's
+    front matter or the sidebar changes, related pages are rescored when a
+    page's term counts change and the search index and link report are
+    rewritten when a page's text, anchors, links or parts change.
+    """
+    
+    def __init__(self, generator: BookGen, host: str = "127.0.0.1", port: int = 8000,
+                 interval: float = 0.5, jobs: int = 1):
+        self.generator = generator
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.jobs = jobs
+        self.contents: Dict[str, str] = {}
+        self.related: Dict[str, List[List[str]]] = {}
+        self.parts: Dict[str, List[str]] = {}
+        self.metadata: Dict[str, Dict] = {}
+        self.collections: List[str] = []
+        # Source hashes as of the last (re)build, to find the previous page records
+        self.hashes: Dict[str, str] = {}
+        self.generation = 0
+        self.rebuilt = threading.Condition()
+    
+    def load_navigation(self):
+        """(Re)parse SUMMARY.md and recompile the shared sidebar"""
+        self.navigation = self.generator.load_navigation()
+        self.tasks = list(self.generator.iter_pages(self.navigation.pages))
+        self.compile_sidebar()
+    
+    def compile_sidebar(self):
+        """Recompile the shared sidebar with the current parts of paginated pages"""
+        self.parts = self.page_parts()
+        self.sidebar = self.generator.compile_sidebar(self.navigation, self.parts)
+        if self.generator.fragments:
+            self.generator.write_sidebar_asset(self.sidebar)
+    
+    def page_parts(self) -> Dict[str, List[str]]:
+        """Labels of the later parts of each paginated page, from the page records"""
+        parts = {}
+        for _, source, _ in self.tasks:
+            source_hash = hash_file(self.generator.root_dir / source)
+            record = (self.generator.read_page_record(source_hash)
+                      or self.generator.analyze_page(source_hash, self.content(source)))
+            if record['parts']:
+                parts[source] = record['parts']
+        return parts
+    
+    def watched_files(self) -> Set[str]:
+        """Paths, relative to the book root, whose changes trigger a rebuild"""
+        return {"book.json", "SUMMARY.md"} | {source for _, source, _ in self.tasks}
+    
+    def snapshot(self) -> Dict[str, int]:
+        """Modification times of the watched files"""
+        mtimes = {}
+        for path in self.watched_files():
+            try:
+                mtimes[path] = (self.generator.root_dir / path).stat().st_mtime_ns
+            except OSError:
+                mtimes[path] = 0
+        return mtimes
+    
+    def content(self, source: str, refresh: bool = False) -> str:
+        """Rendered HTML for a source page, rendering it on first use"""
+        if refresh or source not in self.contents:
+            self.contents[source], metadata = self.generator.render_page_content(self.generator.root_dir / source)
+            self.metadata[source] = metadata or {}
+        return self.contents[source]
+    
+    def write_collections(self):
+        """Rewrite the tag pages, section listings and catalog.json from the
+        front matter in memory, removing collection pages that went away"""
+        index = MetadataIndex()
+        sections = self.generator.page_sections(self.navigation)
+        for title, source, output in self.tasks:
+            entry = {'source': source, 'title': title, 'updated': self.generator.page_timestamp(source),
+                     'meta': self.metadata.get(source, {})}
+            index.add(output, entry, None if output == 'index.html' else sections.get(source))
+        collections = self.generator.write_collections(self.sidebar, index)
+        for output in set(self.collections) - set(collections):
+            self.generator.remove_output(self.generator.output_dir / output)
+            if self.generator.fragments and output.endswith('.html'):
+                self.generator.remove_output(self.generator.fragment_path(output))
+        self.collections = collections
+    
+    def rebuild(self, changed: Set[str]):
+        """Rewrite the pages affected by a set of changed files"""
+        start = time.perf_counter()
+        rewrite_all = False
+        
+        if "book.json" in changed:
+            print("⚙️  book.json changed, re-rendering page shells...")
+            self.generator.reload_config()
+            self.generator.copy_assets()  # highlight.css follows the configured styles
+            rewrite_all = True
+        if "SUMMARY.md" in changed:
+            print("📖 SUMMARY.md changed, re-rendering sidebars...")
+            self.load_navigation()
+            rewrite_all = True
+        
+        hashes = {source: hash_file(self.generator.root_dir / source) for _, source, _ in self.tasks}
+        metadata = dict(self.metadata)
+        edited = changed & hashes.keys()
+        previous = {source: self.generator.read_page_record(self.hashes[source]) if source in self.hashes else None
+                    for source in edited}
+        records = {source: self.generator.analyze_page(hashes[source], self.content(source, refresh=True))
+                   for source in edited}
+        metadata_changed = any(self.metadata.get(source) != metadata.get(source) for source in edited)
+        
+        def records_changed(*fields: str) -> bool:
+            return any(previous[source] is None
+                       or any(previous[source][field] != record[field] for field in fields)
+                       for source, record in records.items())
         
-        # Copy .nojekyll if exists
-        nojekyll = self.root_dir / ".nojekyll"
-        if nojekyll.exists():
-            import shutil
-            shutil.copy(nojekyll, self.output_dir / ".nojekyll")
+        # A page that gained or lost parts changes every page's sidebar
+        parts_changed = records_changed('parts')
+        if parts_changed and self.page_parts() != self.parts:
+            print("📑 Page parts changed, re-rendering sidebars...")
+            self.compile_sidebar()
+            rewrite_all = True
         
-        print(f"✅ Build complete! Output in {self.output_dir}")
-        print(f"📊 Generated {len(pages_to_build) + 1} pages")
+        # An edit can also change the related pages listed on other pages
+        related = self.related
+        if rewrite_all or records_changed('terms'):
+            related = self.generator.find_related(self.tasks) if self.generator.related_count() > 0 else {}
+        count = 0
+        for title, source, output in self.tasks:
+            if rewrite_all or source in changed or related.get(output) != self.related.get(output):
+                self.generator.publish_page(self.sidebar, title, source, output, self.content(source),
+                                            self.generator.related_block(related.get(output)))
+                count += 1
+        self.related = related
+        
+        collections = self.collections
+        if rewrite_all or metadata_changed:
+            self.write_collections()
+        
+        if (rewrite_all or parts_changed or collections != self.collections
+                or records_changed('search', 'anchors', 'links')):
+            self.generator.write_indexes([(title, source, output, hashes[source],
+                                           [self.generator.part_output(output, number)
+                                            for number in range(2, len(self.parts.get(source, [])) + 2)])
+                                          for title, source, output in self.tasks], self.collections)
+        self.hashes = hashes
+        
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"🔄 Rebuilt {count} page(s) in {elapsed:.0f} ms")
+    
+    def start_watcher(self) -> threading.Event:
+        """Wake the rebuild loop on filesystem events where inotify is available.
+        
+        Uses the optional ``watchdog`` package; without it the loop simply
+        polls the watched files every ``interval`` seconds.
+        """
+        wake = threading.Event()
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            print(f"⏱️  Polling for changes every {self.interval}s (install watchdog for inotify)")
+            return wake
+        
+        class WakeHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+        
+        observer = Observer()
+        observer.daemon = True
+        directories = {(self.generator.root_dir / path).parent.resolve() for path in self.watched_files()}
+        for directory in directories:
+            if directory.is_dir():
+                observer.schedule(WakeHandler(), str(directory), recursive=False)
+        observer.start()
+        return wake
+    
+    def serve(self):
+        """Build, serve ``_book/`` and rebuild on changes until interrupted"""
+        self.generator.build(incremental=True, jobs=self.jobs)
+        self.load_navigation()
+        manifest = self.generator.load_manifest()
+        pages = manifest.get('pages', {})
+        self.related = {output: entry['related'] for output, entry in pages.items() if 'related' in entry}
+        self.metadata = {entry['source']: entry.get('meta', {}) for entry in pages.values()}
+        self.collections = manifest.get('collections', [])
+        self.hashes = {entry['source']: entry['hash'] for entry in pages.values()}
+        
+        handler = partial(LiveReloadHandler, directory=str(self.generator.output_dir))
+        httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        httpd.daemon_threads = True
+        httpd.dev_server = self
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        
+        print(f"👀 Serving http://{self.host}:{httpd.server_port}/ - watching for changes (Ctrl+C to stop)")
+        wake = self.start_watcher()
+        snapshot = self.snapshot()
+        try:
+            while True:
+                wake.wait(self.interval)
+                wake.clear()
+                current = self.snapshot()
+                changed = {path for path in current.keys() | snapshot.keys()
+                           if current.get(path) != snapshot.get(path)}
+                if not changed:
+                    continue
+                try:
+                    self.rebuild(changed)
+                except Exception as e:
+                    print(f"❌ Rebuild failed: {e}")
+                snapshot = self.snapshot()
+                with self.rebuilt:
+                    self.generation += 1
+                    self.rebuilt.notify_all()
+        except KeyboardInterrupt:
+            print("👋 Stopping server...")
+        finally:
+            httpd.shutdown()
+
+
+# Where the build daemon listens unless --socket says otherwise
+DAEMON_SOCKET = ".bookgen-cache/daemon.sock"
+
+# Prefix of the last line of a daemon response, followed by a JSON status
+DAEMON_STATUS = '\x00'
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """One client request: a JSON line in, the build's output streamed back"""
+    
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        stream = io.TextIOWrapper(self.wfile, encoding='utf-8', line_buffering=True)
+        try:
+            code = self.server.daemon.handle(request, stream)
+            stream.write(DAEMON_STATUS + json.dumps({'exit': code}) + '\n')
+        finally:
+            stream.detach()
+
+
+class BuildDaemon:
+    """Long-running builder for a book, driven over a Unix socket.
+    
+    The BookGen instance (and with it the configured Markdown instance,
+    the parsed navigation, the highlight cache and the image records) lives
+    as long as the daemon, so a build request only pays for the pages it
+    renders. book.json and SUMMARY.md are checked before every build and
+    reloaded when they changed. Requests are handled one at a time.
+    """
+    
+    def __init__(self, generator: BookGen, socket_path: Path, jobs: int = 1):
+        self.generator = generator
+        self.socket_path = socket_path
+        self.jobs = jobs
+        self.config_hash = hash_file(generator.root_dir / "book.json")
+        self.summary_hash = hash_file(generator.root_dir / "SUMMARY.md")
+        self.running = True
+    
+    def reload_if_changed(self):
+        """Pick up edits to book.json and SUMMARY.md made since the last build"""
+        config_hash = hash_file(self.generator.root_dir / "book.json")
+        if config_hash != self.config_hash:
+            print("⚙️  book.json changed, reloading config...")
+            self.generator.reload_config()
+            self.config_hash = config_hash
+        summary_hash = hash_file(self.generator.root_dir / "SUMMARY.md")
+        if summary_hash != self.summary_hash:
+            print("📖 SUMMARY.md changed, reloading navigation...")
+            self.summary_hash = summary_hash
+    
+    def handle(self, request: Dict, stream) -> int:
+        """Run one request with its output going to ``stream``; returns the exit code"""
+        command = request.get('command', 'build')
+        if command == 'stop':
+            self.running = False
+            print("👋 Stopping daemon...")
+            print("👋 Stopping daemon...", file=stream)
+            return 0
+        if command != 'build':
+            print(f"❌ Error: unknown daemon command '{command}'", file=stream)
+            return 2
+        
+        print(f"🔨 Build requested (incremental={bool(request.get('incremental'))})")
+        start = time.perf_counter()
+        with redirect_stdout(stream):
+            try:
+                self.reload_if_changed()
+                self.generator.build(incremental=request.get('incremental', False),
+                                     jobs=request.get('jobs') or self.jobs,
+                                     profile=request.get('profile', False),
+                                     profile_output=request.get('profile_output'),
+                                     strict_links=request.get('strict_links', False),
+                                     deploy_manifest=request.get('deploy_manifest'))
+                code = 0
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                import traceback
+                traceback.print_exc(file=stream)
+                code = 1
+        print(f"   Finished in {time.perf_counter() - start:.2f}s (exit {code})")
+        return code
+    
+    def serve(self):
+        """Listen on the socket until a stop request or Ctrl+C"""
+        if self.socket_path.exists():
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(str(self.socket_path))
+                raise RuntimeError(f"a daemon is already listening on {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                self.socket_path.unlink()
+            finally:
+                probe.close()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        server = socketserver.UnixStreamServer(str(self.socket_path), DaemonHandler)
+        server.daemon = self
+        print(f"🔥 BookGen daemon ready on {self.socket_path} (Ctrl+C to stop)")
+        try:
+            while self.running:
+                server.handle_request()
+        except KeyboardInterrupt:
+            print("👋 Stopping daemon...")
+        finally:
+            server.server_close()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+
 
 def main():
     """Main entry point"""
-    import sys
+    import argparse
+    
+    commands = ('build', 'serve', 'daemon', 'audit')
+    argv = sys.argv[1:]
+    if not argv or argv[0] not in commands + ('-h', '--help'):
+        argv = ['build'] + argv
+    
+    parser = argparse.ArgumentParser(description="BookGen - A Modern GitBook Alternative")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    build_parser = subparsers.add_parser('build', help="build the static site (default)")
+    serve_parser = subparsers.add_parser('serve', help="serve the book locally and rebuild on changes")
+    daemon_parser = subparsers.add_parser('daemon', help="keep a warm builder running for .bookgen/client.py")
+    for subparser in (build_parser, serve_parser, daemon_parser):
+        subparser.add_argument('root_dir', nargs='?', default='.',
+                               help="book root containing SUMMARY.md (default: .)")
+        subparser.add_argument('-j', '--jobs', type=int, default=1,
+                               help="number of worker processes used to render pages (0 = one per CPU)")
+        subparser.add_argument('--no-cache', action='store_true',
+                               help="render every page from scratch, bypassing .bookgen-cache/render")
+        subparser.add_argument('--cache-size', type=int, default=RENDER_CACHE_MAX_BYTES // (1024 * 1024),
+                               metavar='MB', help="size bound of the render cache in MiB (default: %(default)s)")
+        subparser.add_argument('--precompress', action='store_true',
+                               help="write .gz (and .br, with brotli installed) siblings of every output file")
+        subparser.add_argument('--fragments', action='store_true',
+                               help="also write content-only page fragments for instant client-side navigation")
+        subparser.add_argument('--paginate', type=int, default=PAGINATE_MAX_BYTES // 1024, metavar='KB',
+                               help="split pages larger than this at h2 headings (0 = never; default: %(default)s)")
+        subparser.add_argument('--minify', action='store_true',
+                               help="drop whitespace that does not render from page HTML (off by default)")
+        subparser.add_argument('--critical-css', action='store_true',
+                               help="inline the above-the-fold CSS into every page and load the full "
+                                    "stylesheets without blocking first paint (adds about 2 KiB per page)")
+    
+    build_parser.add_argument('--incremental', action='store_true',
+                              help="only re-render pages whose inputs changed since the last build")
+    build_parser.add_argument('--strict-links', action='store_true',
+                              help="fail the build when internal links or anchors are broken")
+    build_parser.add_argument('--profile', action='store_true',
+                              help="time each build stage, page and Markdown extension")
+    build_parser.add_argument('--profile-output', metavar='PATH',
+                              help="where to write the JSON profile (default: .bookgen-cache/profile.json)")
+    build_parser.add_argument('--deploy-manifest', metavar='PATH',
+                              help="where to write the added/changed/removed file list "
+                                   "(default: .bookgen-cache/deploy.json)")
+    build_parser.add_argument('--output-backend', choices=OUTPUT_BACKENDS, default='dir',
+                              help="write _book/ (dir), a .tar.zst archive (tar), a .zip archive (zip) "
+                                   "or a content-addressed store (store) (default: %(default)s)")
+    build_parser.add_argument('--archive', metavar='PATH',
+                              help="where the tar, zip or store backend writes (default: next to _book)")
+    for subparser in (build_parser, daemon_parser):
+        subparser.add_argument('--offline', action='store_true',
+                               help="write a service worker and precache manifest for cache-first repeat visits")
+    serve_parser.set_defaults(offline=False)
+    for subparser in (serve_parser, daemon_parser):
+        subparser.set_defaults(output_backend='dir', archive=None)
+    serve_parser.add_argument('--host', default='127.0.0.1', help="address to bind (default: 127.0.0.1)")
+    serve_parser.add_argument('--port', type=int, default=8000, help="port to listen on (default: 8000)")
+    serve_parser.add_argument('--interval', type=float, default=0.5,
+                              help="seconds between checks for changes (default: 0.5)")
+    daemon_parser.add_argument('--socket', metavar='PATH',
+                               help=f"Unix socket to listen on (default: <root_dir>/{DAEMON_SOCKET})")
+    
+    audit_parser = subparsers.add_parser('audit', help="break down the bytes of every built page and check budgets")
+    audit_parser.add_argument('root_dir', nargs='?', default='.',
+                              help="book root whose _book/ is audited (default: .)")
+    audit_parser.add_argument('--budget', type=int, metavar='KB',
+                              help="flag pages whose HTML is larger (0 = no budget; default: "
+                                   f"pluginsConfig.audit.budget or {AUDIT_BUDGET_BYTES // 1024})")
+    audit_parser.add_argument('--compressed-budget', type=int, metavar='KB',
+                              help="flag pages whose gzipped HTML is larger "
+                                   "(default: pluginsConfig.audit.compressedBudget or none)")
+    audit_parser.add_argument('--sort', choices=AUDIT_COLUMNS, default='total',
+                              help="column to sort by, largest first (default: %(default)s)")
+    audit_parser.add_argument('--format', choices=('table', 'json', 'csv'), default='table',
+                              help="report format (default: %(default)s)")
+    audit_parser.add_argument('--output', metavar='PATH', help="write the report to a file instead of stdout")
+    args = parser.parse_args(argv)
+    
+    if args.command == 'audit':
+        try:
+            generator = BookGen(args.root_dir)
+            budget, compressed_budget = generator.audit_budgets()
+            if args.budget is not None:
+                budget = args.budget * 1024
+            if args.compressed_budget is not None:
+                compressed_budget = args.compressed_budget * 1024
+            rows = generator.audit(budget, compressed_budget)
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+        rows.sort(key=lambda row: row[args.sort], reverse=args.sort != 'path')
+        generator.write_audit_report(rows, args.format, args.output)
+        sys.exit(1 if any(row['over_budget'] for row in rows) else 0)
     
-    root_dir = sys.argv[1] if len(sys.argv) > 1 else "."
+    jobs = args.jobs or os.cpu_count() or 1
     
     try:
-        generator = BookGen(root_dir)
-        generator.build()
+        generator = BookGen(args.root_dir, use_cache=not args.no_cache,
+                            cache_max_bytes=args.cache_size * 1024 * 1024,
+                            precompress=args.precompress, fragments=args.fragments,
+                            paginate_bytes=args.paginate * 1024, minify=args.minify,
+                            critical_css=args.critical_css,
+                            output_backend=args.output_backend, archive_path=args.archive,
+                            offline=args.offline)
+        if args.command == 'serve':
+            DevServer(generator, args.host, args.port, args.interval, jobs).serve()
+        elif args.command == 'daemon':
+            socket_path = Path(args.socket) if args.socket else generator.root_dir / DAEMON_SOCKET
+            BuildDaemon(generator, socket_path, jobs).serve()
+        else:
+            generator.build(incremental=args.incremental, jobs=jobs, profile=args.profile,
+                            profile_output=args.profile_output, strict_links=args.strict_links,
+                            deploy_manifest=args.deploy_manifest)
     except Exception as e:
         print(f"❌ Error: {e}")
         import traceback